@@ -0,0 +1,188 @@
+"""
+Versioned JSON API for contacts, authenticated with bearer tokens
+"""
+from flask import Blueprint, current_app, g, jsonify, request
+from werkzeug.exceptions import HTTPException
+
+from forms import CONTACT_FIELDS, validate_contact_data
+from models import (db, Contact, api_token_user, bump_contact_version, contact_page, delete_contacts,
+                    insert_contacts, live_contacts, valid_id)
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+# Fields a client may select or update; id is always returned
+CONTACT_COLUMNS = {name: getattr(Contact, name) for name in CONTACT_FIELDS}
+
+
+class ApiError(Exception):
+    """Aborts an API request with a JSON error"""
+    def __init__(self, status, message, **extra):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.extra = extra
+
+
+def api_error(status, message, **extra):
+    """JSON error body with the given status"""
+    response = jsonify(error=message, **extra)
+    response.status_code = status
+    return response
+
+
+def is_api_request():
+    """Whether the current request is for an API path, matched to a route or not"""
+    return request.path.startswith('/api/')
+
+
+def json_body(key=None):
+    """The request's JSON object, or the list stored under key, raising ApiError otherwise"""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        raise ApiError(400, 'Request body must be a JSON object')
+    if key is None:
+        return data
+    items = data.get(key)
+    if not isinstance(items, list) or not items:
+        raise ApiError(400, f'"{key}" must be a non-empty list')
+    if len(items) > current_app.config['API_MAX_BATCH']:
+        raise ApiError(413, f'At most {current_app.config["API_MAX_BATCH"]} items per request')
+    return items
+
+
+@api.errorhandler(ApiError)
+def handle_api_error(error):
+    return api_error(error.status, error.message, **error.extra)
+
+
+@api.errorhandler(HTTPException)
+def handle_http_error(error):
+    return api_error(error.code, error.description)
+
+
+# By status code, so it takes precedence over the app's HTML 500 page
+@api.errorhandler(500)
+def handle_internal_error(error):
+    db.session.rollback()
+    return api_error(500, 'Internal server error')
+
+
+@api.before_request
+def authenticate():
+    """Resolve the bearer token to a user; API requests never use the session or CSRF"""
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    user_id = api_token_user(token.strip()) if scheme.lower() == 'bearer' and token.strip() else None
+    if user_id is None:
+        response = api_error(401, 'A valid bearer token is required')
+        response.headers['WWW-Authenticate'] = 'Bearer'
+        return response
+    g.api_user_id = user_id
+
+
+def owned_contact(contact_id):
+    """The caller's contact with this id, ownership checked the same way as delete_contact()"""
+    if not valid_id(contact_id):
+        raise ApiError(404, 'Contact not found')
+    contact = Contact.query.filter(Contact.id == contact_id, live_contacts(g.api_user_id)).first()
+    if contact is None:
+        raise ApiError(404, 'Contact not found')
+    return contact
+
+
+def contact_json(contact):
+    return {'id': contact.id, **{name: getattr(contact, name) for name in CONTACT_FIELDS}}
+
+
+def selected_columns(fields):
+    """Columns for a ?fields=name,email list, led by Contact.id; all fields when empty"""
+    names = [name.strip() for name in fields.split(',') if name.strip()] if fields else list(CONTACT_FIELDS)
+    names = list(dict.fromkeys(names))
+    unknown = [name for name in names if name not in CONTACT_COLUMNS]
+    if unknown:
+        raise ApiError(400, 'Unknown field(s): ' + ', '.join(unknown), fields=list(CONTACT_FIELDS))
+    return (Contact.id,) + tuple(CONTACT_COLUMNS[name] for name in names)
+
+
+def page_size(limit, config):
+    """Requested page size clamped to API_MAX_PAGE_SIZE"""
+    if limit is None:
+        limit = config['API_PAGE_SIZE']
+    return max(1, min(limit, config['API_MAX_PAGE_SIZE']))
+
+
+@api.route('/contacts', methods=['GET'])
+def list_contacts():
+    """Page through contacts in id order; pass next_cursor back as ?after="""
+    columns = selected_columns(request.args.get('fields'))
+    limit = page_size(request.args.get('limit', type=int), current_app.config)
+    after = request.args.get('after', type=int)
+    if after is not None and not valid_id(after):
+        raise ApiError(400, '"after" is out of range')
+    page = contact_page(g.api_user_id, after=after, per_page=limit, columns=columns)
+    return jsonify(contacts=[row._asdict() for row in page.rows],
+                   next_cursor=page.last_id if page.has_next else None)
+
+
+@api.route('/contacts/<int:contact_id>', methods=['GET'])
+def get_contact(contact_id):
+    """One contact"""
+    return jsonify(contact_json(owned_contact(contact_id)))
+
+
+@api.route('/contacts', methods=['POST'])
+def create_contacts():
+    """Create a batch of contacts in one transaction; nothing is written if any item is invalid"""
+    items = json_body('contacts')
+    rows, errors = [], {}
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            errors[str(index)] = {'contact': ['Must be a JSON object']}
+            continue
+        values, item_errors = validate_contact_data(item)
+        if item_errors:
+            errors[str(index)] = item_errors
+        else:
+            rows.append(values)
+    if errors:
+        raise ApiError(422, 'Validation failed', errors=errors)
+
+    ids = insert_contacts(g.api_user_id, rows, returning=True)
+    db.session.commit()
+    return jsonify(contacts=[dict(row, id=contact_id) for row, contact_id in zip(rows, ids)]), 201
+
+
+@api.route('/contacts', methods=['DELETE'])
+def delete_contact_batch():
+    """Delete the listed contacts in one transaction; ids the caller does not own are reported missing"""
+    ids = json_body('ids')
+    if not all(isinstance(contact_id, int) and not isinstance(contact_id, bool) for contact_id in ids):
+        raise ApiError(400, '"ids" must be a list of integers')
+    if not all(valid_id(contact_id) for contact_id in ids):
+        raise ApiError(400, '"ids" must be 64-bit integers')
+
+    deleted = delete_contacts(g.api_user_id, ids)
+    db.session.commit()
+    removed = set(deleted)
+    return jsonify(deleted=sorted(removed), missing=sorted(set(ids) - removed))
+
+
+@api.route('/contacts/<int:contact_id>', methods=['PATCH'])
+def update_contact(contact_id):
+    """Change some fields of a contact; the merged record must pass the ContactForm rules"""
+    changes = json_body()
+    unknown = [name for name in changes if name not in CONTACT_COLUMNS]
+    if unknown:
+        raise ApiError(400, 'Unknown field(s): ' + ', '.join(unknown), fields=list(CONTACT_FIELDS))
+
+    contact = owned_contact(contact_id)
+    values, errors = validate_contact_data(dict(contact_json(contact), **changes))
+    if errors:
+        raise ApiError(422, 'Validation failed', errors=errors)
+
+    for name, value in values.items():
+        setattr(contact, name, value)
+    if db.session.is_modified(contact):
+        bump_contact_version(g.api_user_id)
+    db.session.commit()
+    # Built from the validated values, so the committed row is not read back
+    return jsonify(dict(values, id=contact_id))
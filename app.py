@@ -1,186 +1,509 @@
-"""
-Simple Flask CRUD Application with Security Features
-"""
-from flask import Flask, render_template, request, redirect, url_for, flash, session
-from flask_wtf.csrf import CSRFProtect
-from flask_bcrypt import Bcrypt
-from forms import LoginForm, ContactForm
-from models import db, User, Contact
-import bleach
-
-app = Flask(__name__)
-
-# Configuration
-app.config['SECRET_KEY'] = 'your-secret-key-here'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///app.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-# CSRF Protection
-app.config['WTF_CSRF_ENABLED'] = True
-app.config['WTF_CSRF_TIME_LIMIT'] = None
-
-# Secure Session Management
-app.config['SESSION_COOKIE_HTTPONLY'] = True
-app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
-app.config['PERMANENT_SESSION_LIFETIME'] = 1800
-
-# Initialize extensions
-db.init_app(app)
-csrf = CSRFProtect(app)
-bcrypt = Bcrypt(app)
-
-# Create database tables
-with app.app_context():
-    db.create_all()
-
-
-@app.route('/')
-def index():
-    """Home page"""
-    return render_template('index.html')
-
-
-@app.route('/login', methods=['GET', 'POST'])
-def login():
-    """Login page"""
-    form = LoginForm()
-    
-    if form.validate_on_submit():
-        username = bleach.clean(form.username.data.strip())
-        password = form.password.data
-        
-        user = User.query.filter_by(username=username).first()
-        
-        if user and bcrypt.check_password_hash(user.password, password):
-            session.permanent = True
-            session['user_id'] = user.id
-            session['username'] = user.username
-            flash('Login successful!')
-            return redirect(url_for('dashboard'))
-        else:
-            flash('Invalid username or password!')
-    
-    return render_template('login.html', form=form)
-
-
-@app.route('/register', methods=['GET', 'POST'])
-def register():
-    """Registration page"""
-    if request.method == 'POST':
-        username = bleach.clean(request.form.get('username', '').strip())
-        password = request.form.get('password', '')
-        
-        if not username or not password:
-            flash('Username and password required!')
-            return redirect(url_for('register'))
-        
-        if User.query.filter_by(username=username).first():
-            flash('Username already exists!')
-            return redirect(url_for('register'))
-        
-        hashed_password = bcrypt.generate_password_hash(password).decode('utf-8')
-        new_user = User(username=username, password=hashed_password)
-        
-        db.session.add(new_user)
-        db.session.commit()
-        flash('Registration successful! Please login.')
-        return redirect(url_for('login'))
-    
-    return render_template('register.html')
-
-
-@app.route('/dashboard')
-def dashboard():
-    """Dashboard"""
-    if 'user_id' not in session:
-        flash('Please login first!')
-        return redirect(url_for('login'))
-    
-    contacts = Contact.query.filter_by(user_id=session['user_id']).all()
-    return render_template('dashboard.html', contacts=contacts)
-
-
-@app.route('/contact', methods=['GET', 'POST'])
-def contact():
-    """Add contact"""
-    if 'user_id' not in session:
-        flash('Please login first!')
-        return redirect(url_for('login'))
-    
-    form = ContactForm()
-    
-    if form.validate_on_submit():
-        name = bleach.clean(form.name.data.strip())
-        email = bleach.clean(form.email.data.strip())
-        phone = bleach.clean(form.phone.data.strip())
-        address = bleach.clean(form.address.data.strip())
-        
-        new_contact = Contact(
-            name=name,
-            email=email,
-            phone=phone,
-            address=address,
-            user_id=session['user_id']
-        )
-        
-        db.session.add(new_contact)
-        db.session.commit()
-        flash('Contact added successfully!')
-        return redirect(url_for('dashboard'))
-    
-    return render_template('contact.html', form=form)
-
-
-@app.route('/delete/<int:contact_id>', methods=['POST'])
-def delete_contact(contact_id):
-    """Delete contact"""
-    if 'user_id' not in session:
-        flash('Please login first!')
-        return redirect(url_for('login'))
-    
-    contact = Contact.query.filter_by(id=contact_id, user_id=session['user_id']).first()
-    
-    if contact:
-        db.session.delete(contact)
-        db.session.commit()
-        flash('Contact deleted!')
-    
-    return redirect(url_for('dashboard'))
-
-
-@app.route('/logout')
-def logout():
-    """Logout"""
-    session.clear()
-    flash('Logged out successfully!')
-    return redirect(url_for('index'))
-
-
-# Secure Error Handling
-@app.errorhandler(404)
-def not_found_error(error):
-    """Handle 404 errors"""
-    return render_template('errors/404.html'), 404
-
-
-@app.errorhandler(500)
-def internal_error(error):
-    """Handle 500 errors"""
-    db.session.rollback()
-    return render_template('errors/500.html'), 500
-
-
-@app.errorhandler(403)
-def forbidden_error(error):
-    """Handle 403 errors"""
-    return render_template('errors/403.html'), 403
-
-
-@app.errorhandler(400)
-def bad_request_error(error):
-    """Handle 400 errors"""
-    return render_template('errors/400.html'), 400
-
-
-if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)
+"""
+Simple Flask CRUD Application with Security Features
+"""
+from flask import (Blueprint, Flask, Response, abort, current_app, get_flashed_messages, jsonify, render_template,
+                   request, redirect, stream_template, url_for, flash, session, stream_with_context)
+from flask_wtf.csrf import CSRFProtect, generate_csrf
+import click
+import time
+import contact_io
+from api import api, api_error, is_api_request
+from caching import conditional, init_caching
+from compression import Compression, coalesce
+from config import Config, engine_options
+from forms import LoginForm, ContactForm, clean_field, clean_text
+from fragments import FragmentCache
+from groupcommit import GroupCommitWriter, WriteQueueBusy
+from instrumentation import Instrumentation
+from metrics import registry
+from models import (db, User, CONTACT_LIST_COLUMNS, contact_page, contact_version, count_contacts, create_api_token,
+                    create_user, delete_contacts, delete_user, insert_contacts, iter_contacts, upgrade_schema,
+                    rebuild_search_index, search_contacts, init_db, valid_id)
+from passwords import PasswordHasher, PasswordPoolBusy, benchmark_costs, rehashed_total
+from purge import ContactPurger
+from ratelimit import RateLimited, RateLimiter, normalize_username, rejection_headers
+from sessions import init_sessions
+from templating import init_templates
+from usernames import UsernameFilter
+
+# Extensions are created unbound and attached to an app in create_app()
+csrf = CSRFProtect()
+compression = Compression()
+hasher = PasswordHasher()
+instrumentation = Instrumentation()
+fragments = FragmentCache()
+limiter = RateLimiter()
+purger = ContactPurger()
+writer = GroupCommitWriter()
+usernames = UsernameFilter()
+
+main = Blueprint('main', __name__, cli_group=None)
+
+
+def create_app(config=None):
+    """Build an application instance.
+
+    config may be a dict or an object whose upper-case attributes override Config.
+    Nothing here connects to the database; create or upgrade the schema with
+    `flask upgrade-db` before serving a new database.
+    """
+    app = Flask(__name__)
+
+    # Configuration
+    app.config.from_object(Config)
+    if isinstance(config, dict):
+        app.config.update(config)
+    elif config is not None:
+        app.config.from_object(config)
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config['SQLALCHEMY_DATABASE_URI']))
+
+    # Initialize extensions
+    init_db(app)
+    # Registered first so its after_request hook runs last, on the finished response
+    compression.init_app(app)
+    csrf.init_app(app)
+    hasher.init_app(app)
+    limiter.init_app(app)
+    instrumentation.init_app(app, db)
+    init_sessions(app)
+    fragments.init_app(app)
+    purger.init_app(app)
+    writer.init_app(app)
+    usernames.init_app(app)
+    init_caching(app)
+
+    app.register_blueprint(main)
+    app.register_blueprint(api)
+    csrf.exempt(api)
+    compression.include(api)
+    init_templates(app)
+    return app
+
+
+@main.cli.command('upgrade-db')
+def upgrade_db_command():
+    """Create the schema, or add missing tables, columns and indexes to an existing database"""
+    changes = upgrade_schema()
+    for change in changes:
+        print(change)
+    print(f"Schema up to date ({len(changes)} change(s))")
+
+
+@main.cli.command('rebuild-search')
+def rebuild_search_command():
+    """Rebuild the contact full-text search index from the contact table"""
+    if rebuild_search_index():
+        print("Search index rebuilt")
+    else:
+        print("No search index to rebuild: search uses the contact table directly on this database")
+
+
+@main.cli.command('purge-contacts')
+@click.option('--grace', type=int,
+              help='Keep tombstones younger than this many seconds (default: CONTACT_PURGE_GRACE)')
+@click.option('--batch-size', type=int, help='Rows deleted per transaction (default: CONTACT_PURGE_BATCH_SIZE)')
+def purge_contacts_command(grace, batch_size):
+    """Delete soft-deleted contacts now instead of waiting for the background purger"""
+    print(f"Purged {purger.purge(grace=grace, batch_size=batch_size)} contact(s)")
+
+
+@main.cli.command('delete-user')
+@click.argument('username')
+def delete_user_command(username):
+    """Delete an account, its API tokens and sessions; its contacts are left to the purger"""
+    user = User.query.filter_by(username=username).first()
+    if user is None:
+        raise click.ClickException(f"No such user: {username}")
+    user_id = user.id
+    delete_user(user_id)
+    db.session.commit()
+    if hasattr(current_app.session_interface, 'revoke_user'):
+        current_app.session_interface.revoke_user(user_id)
+    print(f"Deleted {username}")
+
+
+@main.cli.command('password-costs')
+def password_costs_command():
+    """Report how many accounts are stored at each bcrypt cost"""
+    # Hashes look like $2b$12$..., so the cost is characters 5-6
+    cost = db.func.substr(User.password, 5, 2)
+    rows = db.session.query(cost, db.func.count(User.id)).group_by(cost).order_by(cost).all()
+    print(f"Configured cost: {hasher.rounds}")
+    for value, count in rows:
+        marker = '' if value == f'{hasher.rounds:02d}' else '  (rehashed on next login)'
+        print(f"  cost {value}: {count} account(s){marker}")
+
+
+@main.cli.command('bcrypt-benchmark')
+@click.option('--min-cost', default=4, show_default=True, help='Lowest bcrypt cost to time')
+@click.option('--max-cost', default=14, show_default=True, help='Highest bcrypt cost to time')
+@click.option('--seconds', default=1.0, show_default=True, help='Time spent hashing at each cost')
+def bcrypt_benchmark_command(min_cost, max_cost, seconds):
+    """Measure bcrypt hashes per second on this host to choose BCRYPT_LOG_ROUNDS"""
+    print(f"{'cost':>4}  {'hashes/s':>10}  {'ms/hash':>10}")
+    for cost, rate, per_hash in benchmark_costs(range(min_cost, max_cost + 1), seconds):
+        print(f"{cost:>4}  {rate:>10.1f}  {per_hash * 1000:>10.1f}")
+
+
+@main.cli.command('revoke-sessions')
+@click.argument('username')
+def revoke_sessions_command(username):
+    """Log a user out everywhere by deleting their server-side sessions"""
+    user = User.query.filter_by(username=username).first()
+    if user is None:
+        raise click.ClickException(f"No such user: {username}")
+    if not hasattr(current_app.session_interface, 'revoke_user'):
+        raise click.ClickException("Cookie sessions cannot be revoked; set SESSION_BACKEND to sqlite or file")
+    print(f"Revoked {current_app.session_interface.revoke_user(user.id)} session(s)")
+
+
+@main.cli.command('sweep-sessions')
+def sweep_sessions_command():
+    """Delete expired server-side sessions now instead of waiting for the sweeper"""
+    if not hasattr(current_app.session_interface, 'store'):
+        raise click.ClickException("Cookie sessions are not stored on the server")
+    print(f"Removed {current_app.session_interface.store.sweep(time.time())} expired session(s)")
+
+
+@main.cli.command('create-api-token')
+@click.argument('username')
+@click.option('--name', default='default', show_default=True, help='Label to recognise the token by')
+def create_api_token_command(username, name):
+    """Issue a bearer token for the JSON API; it is shown only once"""
+    user = User.query.filter_by(username=username).first()
+    if user is None:
+        raise click.ClickException(f"No such user: {username}")
+    print(create_api_token(user.id, name))
+
+
+@main.cli.command('revoke-api-tokens')
+@click.argument('username')
+def revoke_api_tokens_command(username):
+    """Delete every API token a user holds"""
+    user = User.query.filter_by(username=username).first()
+    if user is None:
+        raise click.ClickException(f"No such user: {username}")
+    count = len(user.api_tokens)
+    user.api_tokens.clear()
+    db.session.commit()
+    print(f"Revoked {count} token(s)")
+
+
+def rehash_password(user, password):
+    """Store the password again at the configured cost after a successful login"""
+    try:
+        user.password = hasher.generate_password_hash(password)
+        db.session.commit()
+        rehashed_total.inc()
+    except PasswordPoolBusy:
+        # Not worth failing the login; the next one will try again
+        db.session.rollback()
+
+
+@main.route('/')
+@conditional()
+def index():
+    """Home page"""
+    return render_template('index.html')
+
+
+@main.route('/login', methods=['GET', 'POST'])
+@limiter.limit('login', username_field='username')
+@conditional()
+def login():
+    """Login page"""
+    form = LoginForm()
+    
+    if form.validate_on_submit():
+        username = clean_field(form.username)
+        password = form.password.data
+        
+        user = User.query.filter_by(username=username).first()
+        
+        if user and hasher.check_password_hash(user.password, password):
+            if hasher.needs_rehash(user.password):
+                rehash_password(user, password)
+            limiter.reset('login', 'username', normalize_username(form.username.data))
+            session.permanent = True
+            session['user_id'] = user.id
+            session['username'] = user.username
+            flash('Login successful!')
+            return redirect(url_for('main.dashboard'))
+        else:
+            flash('Invalid username or password!')
+    
+    return render_template('login.html', form=form)
+
+
+@main.route('/register', methods=['GET', 'POST'])
+@limiter.limit('register')
+@conditional()
+def register():
+    """Registration page"""
+    if request.method == 'POST':
+        username = clean_text(request.form.get('username', '').strip())
+        password = request.form.get('password', '')
+        
+        if not username or not password:
+            flash('Username and password required!')
+            return redirect(url_for('main.register'))
+        
+        # Turn away taken names before spending bcrypt time; the filter usually answers
+        # without a query. A name taken since is caught by the insert below.
+        if not usernames.is_available(username):
+            flash('Username already exists!')
+            return redirect(url_for('main.register'))
+        
+        hashed_password = hasher.generate_password_hash(password)
+        if create_user(username, hashed_password) is None:
+            flash('Username already exists!')
+            return redirect(url_for('main.register'))
+        
+        usernames.add(username)
+        flash('Registration successful! Please login.')
+        return redirect(url_for('main.login'))
+    
+    return render_template('register.html')
+
+
+@main.route('/register/check')
+@limiter.limit('username_check', methods=('GET',))
+def check_username():
+    """Live availability check for the registration form"""
+    username = clean_text(request.args.get('username', '').strip())
+    if not username:
+        return jsonify(error='username is required'), 400
+    return jsonify(username=username, available=usernames.is_available(username))
+
+
+def dashboard_revision():
+    """Version of the contact list shown on the dashboard"""
+    return contact_version(session['user_id']) if 'user_id' in session else None
+
+
+@main.route('/dashboard')
+@conditional(dashboard_revision)
+def dashboard():
+    """Dashboard"""
+    if 'user_id' not in session:
+        flash('Please login first!')
+        return redirect(url_for('main.login'))
+    
+    user_id = session['user_id']
+    after = request.args.get('after', type=int)
+    before = request.args.get('before', type=int)
+    if not all(valid_id(cursor) for cursor in (after, before) if cursor is not None):
+        abort(400)
+    per_page = current_app.config['CONTACTS_PER_PAGE']
+
+    def table_context():
+        page = contact_page(user_id, after=after, before=before, per_page=per_page)
+        return {'contacts': page.rows, 'page': page, 'total': count_contacts(user_id)}
+
+    # The version moves on every write, so a cached table is never stale
+    key = (user_id, contact_version(user_id), after, before, per_page)
+    table = fragments.render('contact_table', key, '_contact_table.html', table_context)
+    return render_template('dashboard.html', contact_table=table)
+
+
+@main.route('/dashboard/all')
+@compression.include
+@conditional(dashboard_revision)
+def dashboard_all():
+    """Every contact on one page, streamed to the client as rows come off the cursor"""
+    if 'user_id' not in session:
+        flash('Please login first!')
+        return redirect(url_for('main.login'))
+
+    user_id = session['user_id']
+    # The session is saved before the body streams, so anything that writes to it -
+    # creating the CSRF token, consuming flashed messages - has to happen now
+    token = generate_csrf()
+    get_flashed_messages()
+    contacts = iter_contacts(user_id, columns=CONTACT_LIST_COLUMNS,
+                             batch_size=current_app.config['CONTACT_EXPORT_BATCH_SIZE'])
+    chunks = stream_template('dashboard_all.html', contacts=contacts, total=count_contacts(user_id), token=token)
+    return Response(coalesce(chunks, current_app.config['STREAM_CHUNK_SIZE']), mimetype='text/html')
+
+
+@main.route('/search')
+def search():
+    """Search contacts"""
+    if 'user_id' not in session:
+        flash('Please login first!')
+        return redirect(url_for('main.login'))
+
+    query = request.args.get('q', '').strip()[:100]
+    page = max(request.args.get('page', 1, type=int), 1)
+    if not valid_id(page * current_app.config['CONTACTS_PER_PAGE']):
+        abort(400)
+    contacts, has_next = search_contacts(session['user_id'], query, page=page,
+                                         per_page=current_app.config['CONTACTS_PER_PAGE'])
+    return render_template('search.html', contacts=contacts, query=query, page=page, has_next=has_next)
+
+
+@main.route('/contact', methods=['GET', 'POST'])
+def contact():
+    """Add contact"""
+    if 'user_id' not in session:
+        flash('Please login first!')
+        return redirect(url_for('main.login'))
+    
+    form = ContactForm()
+    
+    if form.validate_on_submit():
+        name = clean_field(form.name)
+        email = clean_field(form.email)
+        phone = clean_field(form.phone)
+        address = clean_field(form.address)
+        
+        new_contact = dict(
+            name=name,
+            email=email,
+            phone=phone,
+            address=address,
+        )
+        
+        writer.run(insert_contacts, session['user_id'], [new_contact])
+        flash('Contact added successfully!')
+        return redirect(url_for('main.dashboard'))
+    
+    return render_template('contact.html', form=form)
+
+
+@main.route('/delete/<int:contact_id>', methods=['POST'])
+def delete_contact(contact_id):
+    """Delete contact"""
+    if 'user_id' not in session:
+        flash('Please login first!')
+        return redirect(url_for('main.login'))
+    
+    # A single UPDATE that checks ownership and tombstones the row; the purger deletes it later
+    if valid_id(contact_id) and writer.run(delete_contacts, session['user_id'], [contact_id]):
+        flash('Contact deleted!')
+    
+    return redirect(url_for('main.dashboard'))
+
+
+@main.route('/contacts/import', methods=['GET', 'POST'])
+def import_contacts():
+    """Bulk import contacts from a CSV or JSONL file"""
+    if 'user_id' not in session:
+        flash('Please login first!')
+        return redirect(url_for('main.login'))
+
+    result = None
+    if request.method == 'POST':
+        upload = request.files.get('file')
+        fmt = upload.filename.rsplit('.', 1)[-1].lower() if upload and upload.filename else ''
+        if fmt not in contact_io.FORMATS:
+            flash('Please choose a .csv or .jsonl file!')
+            return redirect(url_for('main.import_contacts'))
+
+        result = contact_io.import_contacts(session['user_id'], upload.stream, fmt,
+                                            batch_size=current_app.config['CONTACT_IMPORT_BATCH_SIZE'])
+        flash(f'Imported {result.imported} contact(s), {result.failed} row(s) rejected.')
+
+    return render_template('import.html', result=result)
+
+
+@main.route('/contacts/export.<fmt>')
+@compression.include
+def export_contacts(fmt):
+    """Download all contacts as CSV or JSONL"""
+    if 'user_id' not in session:
+        flash('Please login first!')
+        return redirect(url_for('main.login'))
+
+    if fmt not in contact_io.FORMATS:
+        abort(404)
+
+    rows = contact_io.export_contacts(session['user_id'], fmt,
+                                      batch_size=current_app.config['CONTACT_EXPORT_BATCH_SIZE'])
+    return Response(stream_with_context(rows), mimetype=contact_io.FORMATS[fmt],
+                    headers={'Content-Disposition': f'attachment; filename=contacts.{fmt}'})
+
+
+@main.route('/logout')
+def logout():
+    """Logout"""
+    session.clear()
+    flash('Logged out successfully!')
+    return redirect(url_for('main.index'))
+
+
+@main.route('/metrics')
+@compression.include
+def metrics():
+    """Prometheus metrics"""
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+
+# Secure Error Handling
+@main.app_errorhandler(404)
+def not_found_error(error):
+    """Handle 404 errors"""
+    # Unrouted API paths never reach the api blueprint's own handlers
+    if is_api_request():
+        return api_error(404, error.description)
+    return render_template('errors/404.html'), 404
+
+
+@main.app_errorhandler(405)
+def method_not_allowed_error(error):
+    """Handle 405 errors: JSON for API paths, Werkzeug's page elsewhere"""
+    if is_api_request():
+        allow = {'Allow': ', '.join(error.valid_methods)} if error.valid_methods else {}
+        return api_error(405, error.description), allow
+    return error
+
+
+@main.app_errorhandler(500)
+def internal_error(error):
+    """Handle 500 errors"""
+    db.session.rollback()
+    return render_template('errors/500.html'), 500
+
+
+@main.app_errorhandler(403)
+def forbidden_error(error):
+    """Handle 403 errors"""
+    return render_template('errors/403.html'), 403
+
+
+@main.app_errorhandler(400)
+def bad_request_error(error):
+    """Handle 400 errors"""
+    return render_template('errors/400.html'), 400
+
+
+@main.app_errorhandler(503)
+def service_unavailable_error(error):
+    """Handle 503 errors"""
+    return render_template('errors/503.html'), 503, {'Retry-After': '1'}
+
+
+@main.app_errorhandler(PasswordPoolBusy)
+def password_pool_busy_error(error):
+    """Shed login and registration load when the password pool is saturated"""
+    return service_unavailable_error(error)
+
+
+@main.app_errorhandler(WriteQueueBusy)
+def write_queue_busy_error(error):
+    """Shed writes when the group-commit writer falls behind"""
+    return service_unavailable_error(error)
+
+
+@main.app_errorhandler(RateLimited)
+def rate_limited_error(error):
+    """Refuse throttled login and registration attempts without touching the database"""
+    headers = rejection_headers(error)
+    return render_template('errors/429.html', retry_after=headers['Retry-After']), 429, headers
+
+
+if __name__ == '__main__':
+    app = create_app()
+    with app.app_context():
+        upgrade_schema()
+    app.run(debug=True, host='0.0.0.0', port=5000)
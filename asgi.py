@@ -0,0 +1,199 @@
+"""
+ASGI entry point for event-loop servers, e.g. uvicorn asgi:app
+
+Connections are held by the event loop, so idle and slow clients cost no thread.
+Contact reads from the JSON API run natively on the loop with the aiosqlite driver;
+every other request is buffered and then handled by the Flask app on a pool of
+ASGI_THREADS threads, where bcrypt is already offloaded to the password process pool.
+"""
+import json
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from api import ApiError, page_size, selected_columns
+from app import create_app
+from forms import CONTACT_FIELDS
+from instrumentation import request_seconds, requests_total
+from models import db, ApiToken, Contact, apply_sqlite_pragmas, hash_api_token, live_contacts, valid_id
+
+LIST_PATH = re.compile(r'^/api/v1/contacts$')
+ITEM_PATH = re.compile(r'^/api/v1/contacts/(\d+)$')
+
+# Pool settings that carry over from the synchronous engine
+POOL_OPTIONS = ('pool_size', 'max_overflow', 'pool_timeout', 'pool_recycle')
+
+
+def async_engine_for(app):
+    """An aiosqlite engine on the app's SQLite database, or None for other databases"""
+    with app.app_context():
+        url = db.engine.url
+    if url.get_backend_name() != 'sqlite' or url.database in (None, '', ':memory:'):
+        return None
+    options = app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {}
+    engine = create_async_engine(url.set(drivername='sqlite+aiosqlite'),
+                                 **{name: options[name] for name in POOL_OPTIONS if name in options})
+    pragmas = app.config.get('SQLITE_PRAGMAS')
+    if pragmas:
+        event.listen(engine.sync_engine, 'connect', partial(apply_sqlite_pragmas, dict(pragmas)))
+    return engine
+
+
+def query_arg(query, name, convert=str):
+    values = query.get(name)
+    if not values:
+        return None
+    try:
+        return convert(values[0])
+    except ValueError:
+        return None
+
+
+class ContactReads(object):
+    """GET /api/v1/contacts and /api/v1/contacts/<id> served without leaving the event loop"""
+    def __init__(self, config, engine):
+        self.config = config
+        self.engine = engine
+
+    def match(self, path):
+        if LIST_PATH.match(path):
+            return 'api.list_contacts', self.list_contacts, ()
+        item = ITEM_PATH.match(path)
+        if item:
+            return 'api.get_contact', self.get_contact, (int(item.group(1)),)
+        return None
+
+    async def authenticate(self, conn, headers):
+        scheme, _, token = headers.get(b'authorization', b'').decode('latin-1').partition(' ')
+        if scheme.lower() != 'bearer' or not token.strip():
+            return None
+        result = await conn.execute(
+            select(ApiToken.user_id).where(ApiToken.token_hash == hash_api_token(token.strip())))
+        return result.scalar()
+
+    async def list_contacts(self, conn, user_id, query):
+        columns = selected_columns(query_arg(query, 'fields'))
+        limit = page_size(query_arg(query, 'limit', int), self.config)
+        statement = select(*columns).where(live_contacts(user_id))
+        after = query_arg(query, 'after', int)
+        if after is not None:
+            if not valid_id(after):
+                raise ApiError(400, '"after" is out of range')
+            statement = statement.where(Contact.id > after)
+        rows = (await conn.execute(statement.order_by(Contact.id).limit(limit + 1))).all()
+        more = len(rows) > limit
+        rows = rows[:limit]
+        return 200, {'contacts': [row._asdict() for row in rows],
+                     'next_cursor': rows[-1].id if more else None}
+
+    async def get_contact(self, conn, user_id, query, contact_id):
+        if not valid_id(contact_id):
+            raise ApiError(404, 'Contact not found')
+        columns = (Contact.id,) + tuple(getattr(Contact, name) for name in CONTACT_FIELDS)
+        result = await conn.execute(
+            select(*columns).where(Contact.id == contact_id, live_contacts(user_id)))
+        row = result.first()
+        if row is None:
+            raise ApiError(404, 'Contact not found')
+        return 200, row._asdict()
+
+    async def handle(self, handler, args, scope):
+        headers = dict(scope['headers'])
+        query = parse_qs(scope['query_string'].decode('latin-1'))
+        async with self.engine.connect() as conn:
+            user_id = await self.authenticate(conn, headers)
+            if user_id is None:
+                return 401, {'error': 'A valid bearer token is required'}, [(b'www-authenticate', b'Bearer')]
+            try:
+                status, body = await handler(conn, user_id, query, *args)
+            except ApiError as error:
+                status, body = error.status, dict(error=error.message, **error.extra)
+        return status, body, []
+
+
+class PooledWsgiInstance(WsgiToAsgiInstance):
+    """One WSGI request run on the adapter's thread pool"""
+    executor = None
+
+    async def run_wsgi_app(self, body):
+        # asgiref's own run_wsgi_app is thread_sensitive, which runs every request on
+        # one shared thread, one at a time
+        run = WsgiToAsgiInstance.__dict__['run_wsgi_app'].func
+        await sync_to_async(run, thread_sensitive=False, executor=self.executor)(self, body)
+
+
+class PooledWsgiToAsgi(WsgiToAsgi):
+    """WsgiToAsgi that handles concurrent requests on up to threads threads"""
+    def __init__(self, wsgi_application, threads):
+        super().__init__(wsgi_application)
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='wsgi')
+
+    async def __call__(self, scope, receive, send):
+        instance = PooledWsgiInstance(self.wsgi_application)
+        instance.executor = self.executor
+        await instance(scope, receive, send)
+
+
+class AsgiApp(object):
+    """Routes native reads to ContactReads and everything else to the WSGI app"""
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.wsgi = PooledWsgiToAsgi(flask_app, flask_app.config['ASGI_THREADS'])
+        self.engine = async_engine_for(flask_app)
+        self.reads = ContactReads(flask_app.config, self.engine) if self.engine is not None else None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        if scope['type'] == 'http' and scope['method'] == 'GET' and self.reads is not None:
+            route = self.reads.match(scope['path'])
+            if route is not None:
+                await self.native(route, scope, send)
+                return
+        await self.wsgi(scope, receive, send)
+
+    async def native(self, route, scope, send):
+        endpoint, handler, args = route
+        start = time.perf_counter()
+        try:
+            status, body, headers = await self.reads.handle(handler, args, scope)
+        except Exception:
+            self.flask_app.logger.exception('Unhandled error in %s', endpoint)
+            status, body, headers = 500, {'error': 'Internal server error'}, []
+
+        payload = json.dumps(body, separators=(',', ':'), sort_keys=True).encode('utf-8') + b'\n'
+        await send({'type': 'http.response.start', 'status': status, 'headers': [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(payload)).encode('ascii')),
+        ] + headers})
+        await send({'type': 'http.response.body', 'body': payload})
+        requests_total.inc(endpoint=endpoint, method='GET', status=status)
+        request_seconds.observe(time.perf_counter() - start, endpoint=endpoint, method='GET')
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self.engine is not None:
+                    await self.engine.dispose()
+                self.wsgi.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+def create_asgi_app(config=None):
+    """Build the Flask app and wrap it for an ASGI server"""
+    return AsgiApp(create_app(config))
+
+
+app = create_asgi_app()
@@ -0,0 +1,211 @@
+"""
+WSGI vs ASGI under many concurrent and idle connections
+
+Starts each server in a subprocess against the same scratch database, parks a number
+of idle clients on it (connections that never finish sending their request, like slow
+mobile clients), then drives keep-alive connections that request either a JSON API
+page, which the ASGI app serves natively, or an HTML page, which it hands to Flask on
+its thread pool.
+Reports throughput, latency percentiles and the most threads the server process used.
+
+    python -m benchmarks.bench_asgi --connections 200 --idle 500
+    python -m benchmarks.bench_asgi --routes html --connections 50 --idle 0
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ROUTES = {
+    'api': '/api/v1/contacts?limit=50',
+    'html': '/login',
+}
+
+SERVERS = {
+    # The threaded development server behind app.run(): one thread per connection
+    'wsgi': [sys.executable, '-c',
+             'import sys; from werkzeug.serving import run_simple; from wsgi import app; '
+             'run_simple("127.0.0.1", int(sys.argv[1]), app, threaded=True)'],
+    'asgi': [sys.executable, '-m', 'uvicorn', 'asgi:app', '--host', '127.0.0.1', '--log-level', 'warning',
+             '--no-access-log', '--port'],
+}
+
+
+def seed(directory, contacts):
+    """Create the scratch database and return (environment, bearer token)"""
+    env = dict(os.environ,
+               DATABASE_URL='sqlite:///' + os.path.join(directory, 'bench.db'),
+               SESSION_BACKEND='cookie', BCRYPT_LOG_ROUNDS='4', PASSWORD_POOL_WORKERS='0')
+    script = (
+        'from app import create_app\n'
+        'from models import db, User, insert_contacts, create_api_token, upgrade_schema\n'
+        'app = create_app()\n'
+        'with app.app_context():\n'
+        '    upgrade_schema()\n'
+        '    user = User(username="bench", password="x")\n'
+        '    db.session.add(user)\n'
+        '    db.session.commit()\n'
+        f'    insert_contacts(user.id, [dict(name=f"Contact {{i}}", email=f"c{{i}}@example.com", '
+        f'phone="5550000000", address="1 Example Street") for i in range({contacts})])\n'
+        '    db.session.commit()\n'
+        '    print(create_api_token(user.id, "bench"))\n'
+    )
+    output = subprocess.run([sys.executable, '-c', script], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return env, output.strip().splitlines()[-1]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def thread_count(pid):
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            if line.startswith('Threads:'):
+                return int(line.split()[1])
+    return 0
+
+
+async def wait_for_port(port, timeout=20):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            _, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError(f'server on port {port} did not start')
+
+
+async def read_response(reader):
+    head = await reader.readuntil(b'\r\n\r\n')
+    status = int(head.split(b' ', 2)[1])
+    length, close = 0, False
+    for line in head.split(b'\r\n')[1:]:
+        name, _, value = line.partition(b':')
+        name = name.strip().lower()
+        if name == b'content-length':
+            length = int(value)
+        elif name == b'connection' and value.strip().lower() == b'close':
+            close = True
+    await reader.readexactly(length)
+    return status, close
+
+
+async def client(port, path, token, requests, latencies, errors):
+    request = (f'GET {path} HTTP/1.1\r\nHost: bench\r\n'
+               f'Authorization: Bearer {token}\r\n\r\n').encode()
+    reader = writer = None
+    for _ in range(requests):
+        start = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(request)
+            status, close = await read_response(reader)
+            if close:
+                writer.close()
+                writer = None
+            if status != 200:
+                errors.append(status)
+                continue
+            latencies.append(time.perf_counter() - start)
+        except (OSError, asyncio.IncompleteReadError) as error:
+            errors.append(type(error).__name__)
+            writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def idle_client(port, stop):
+    """Sends half a request and then waits, holding the connection open"""
+    try:
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(b'GET /api/v1/contacts HTTP/1.1\r\nHost: bench\r\n')
+        await writer.drain()
+        await stop.wait()
+        writer.close()
+    except OSError:
+        pass
+
+
+async def measure(port, pid, path, token, connections, idle, requests):
+    stop = asyncio.Event()
+    idlers = [asyncio.ensure_future(idle_client(port, stop)) for _ in range(idle)]
+    await asyncio.sleep(1.0)
+
+    peak = thread_count(pid)
+    latencies, errors = [], []
+    workers = asyncio.ensure_future(asyncio.gather(
+        *(client(port, path, token, requests, latencies, errors) for _ in range(connections))))
+    start = time.perf_counter()
+    while not workers.done():
+        peak = max(peak, thread_count(pid))
+        await asyncio.sleep(0.05)
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    await asyncio.gather(*idlers)
+    latencies.sort()
+
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p / 100))] * 1000 if latencies else 0.0
+    return {'requests': len(latencies), 'errors': len(errors), 'throughput': len(latencies) / elapsed,
+            'p50_ms': percentile(50), 'p99_ms': percentile(99), 'threads': peak}
+
+
+def run_server(name, routes, env, token, connections, idle, requests):
+    """Results per route for one server"""
+    port = free_port()
+    command = SERVERS[name] + [str(port)]
+    server = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        asyncio.run(wait_for_port(port))
+        return {route: asyncio.run(measure(port, server.pid, ROUTES[route], token, connections, idle, requests))
+                for route in routes}
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare WSGI and ASGI serving under many connections')
+    parser.add_argument('--connections', type=int, default=100, help='Concurrent busy keep-alive clients')
+    parser.add_argument('--idle', type=int, default=200, help='Idle clients parked on the server')
+    parser.add_argument('--requests', type=int, default=20, help='Requests per busy client')
+    parser.add_argument('--contacts', type=int, default=500)
+    parser.add_argument('--servers', default='wsgi,asgi')
+    parser.add_argument('--routes', default='api,html', help=f'Comma-separated, from {", ".join(ROUTES)}')
+    args = parser.parse_args()
+
+    routes = args.routes.split(',')
+    with tempfile.TemporaryDirectory() as directory:
+        env, token = seed(directory, args.contacts)
+        results = {name: run_server(name, routes, env, token, args.connections, args.idle, args.requests)
+                   for name in args.servers.split(',')}
+
+    print("=" * 80)
+    print(f"WSGI vs ASGI - {args.connections} busy + {args.idle} idle connection(s), "
+          f"{args.requests} request(s) each")
+    print("=" * 80)
+    print(f"{'server':<8} {'route':<6} {'reqs':>7} {'errors':>7} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} "
+          f"{'threads':>8}")
+    for name, by_route in results.items():
+        for route, row in by_route.items():
+            print(f"{name:<8} {route:<6} {row['requests']:>7} {row['errors']:>7} {row['throughput']:>9.1f} "
+                  f"{row['p50_ms']:>9.1f} {row['p99_ms']:>9.1f} {row['threads']:>8}")
+    print("=" * 80)
+
+
+if __name__ == '__main__':
+    main()
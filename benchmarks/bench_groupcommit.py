@@ -0,0 +1,114 @@
+"""
+Write benchmark: one commit per request vs group commit
+
+Request threads add and delete contacts the way contact() and delete_contact() do,
+through GroupCommitWriter.run(), first with group commit off and then on. Each
+configuration gets a fresh database file. SQLITE_SYNCHRONOUS=FULL makes every
+commit fsync, which is where batching pays most.
+
+    python -m benchmarks.bench_groupcommit --threads 32 --seconds 5 --synchronous FULL
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from app import create_app
+from config import Config
+from groupcommit import GroupCommitWriter
+from models import db, User, delete_contacts, insert_contacts, upgrade_schema
+
+USERS = 20
+
+CONTACT = dict(name='New Contact', email='new@example.com', phone='5550000001', address='2 Example Street')
+
+
+def make_app(path, enabled, window_ms, max_ops, synchronous):
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}',
+        'SQLALCHEMY_ENGINE_OPTIONS': {'pool_size': 64, 'max_overflow': 0},
+        'SQLITE_PRAGMAS': dict(Config.SQLITE_PRAGMAS, synchronous=synchronous),
+        'SESSION_BACKEND': 'cookie',
+        'TEMPLATE_WARMUP': False,
+        'CONTACT_PURGE_INTERVAL': 0,
+    })
+    with app.app_context():
+        upgrade_schema()
+        db.session.add_all([User(username=f'user{i}', password='x') for i in range(USERS)])
+        db.session.commit()
+    writer = GroupCommitWriter()
+    app.config.update(GROUP_COMMIT_ENABLED=enabled, GROUP_COMMIT_WINDOW_MS=window_ms,
+                      GROUP_COMMIT_MAX_OPS=max_ops)
+    writer.init_app(app)
+    return app, writer
+
+
+def run(app, writer, threads, seconds):
+    """Insert and delete from request threads, returning (operations, errors, latencies)"""
+    stop = time.perf_counter() + seconds
+    latencies, errors = [], []
+    lock = threading.Lock()
+
+    def request_thread(worker):
+        user_id = worker % USERS + 1
+        mine, failed = [], 0
+        while time.perf_counter() < stop:
+            start = time.perf_counter()
+            # Every third request deletes the contact added two requests earlier
+            try:
+                with app.app_context():
+                    if len(mine) % 3 == 2:
+                        writer.run(delete_contacts, user_id, [mine[-2]])
+                        mine.append(None)
+                    else:
+                        ids = writer.run(insert_contacts, user_id, [CONTACT], True)
+                        mine.append(ids[0])
+            except Exception:
+                failed += 1
+                continue
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+        with lock:
+            errors.append(failed)
+
+    workers = [threading.Thread(target=request_thread, args=(i,)) for i in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return len(latencies), sum(errors), sorted(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare one commit per request with group commit')
+    parser.add_argument('--threads', type=int, default=32, help='Concurrent request threads')
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--window-ms', type=float, default=2.0)
+    parser.add_argument('--max-ops', type=int, default=64)
+    parser.add_argument('--synchronous', default='FULL', help='SQLite synchronous pragma for both runs')
+    args = parser.parse_args()
+
+    print("=" * 80)
+    print(f"GROUP COMMIT - {args.threads} request threads, {args.seconds:g}s each, "
+          f"synchronous={args.synchronous}")
+    print("=" * 80)
+    print(f"{'mode':<16} {'writes/s':>10} {'errors':>8} {'p50 ms':>9} {'p99 ms':>9}")
+    with tempfile.TemporaryDirectory() as directory:
+        for name, enabled in (('commit/request', False), ('group commit', True)):
+            app, writer = make_app(os.path.join(directory, f'{enabled}.db'), enabled,
+                                   args.window_ms, args.max_ops, args.synchronous)
+            operations, errors, latencies = run(app, writer, args.threads, args.seconds)
+            with app.app_context():
+                db.engine.dispose()
+
+            def percentile(p):
+                return latencies[min(len(latencies) - 1, int(len(latencies) * p / 100))] * 1000 if latencies else 0.0
+            print(f"{name:<16} {operations / args.seconds:>10.0f} {errors:>8} "
+                  f"{percentile(50):>9.2f} {percentile(99):>9.2f}")
+    print("=" * 80)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Microbenchmark: cost of a rate limiter check next to the bcrypt work it protects
+
+    python -m benchmarks.bench_ratelimit --threads 8
+"""
+import argparse
+import threading
+import time
+import timeit
+
+from passwords import _check_password, _hash_password
+from ratelimit import MemoryStore, RateLimiter, Rule
+
+# Large enough that no benchmark call is ever rejected
+UNLIMITED = Rule(capacity=10 ** 12, period=1)
+
+
+def make_limiter(max_keys=100000):
+    limiter = RateLimiter(store=MemoryStore(max_keys))
+    limiter.rules = {('login', 'ip'): UNLIMITED, ('login', 'username'): UNLIMITED}
+    return limiter
+
+
+def bench(func, number):
+    best = min(timeit.repeat(func, number=number, repeat=5))
+    return best / number * 1e6
+
+
+def threaded_us(limiter, threads, calls):
+    """Mean wall time per check with threads checking distinct keys at once"""
+    def worker(n):
+        for i in range(calls):
+            limiter.hit('login', 'ip', f'10.{n}.{i % 256}.{i // 256 % 256}')
+
+    pool = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    start = time.perf_counter()
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return (time.perf_counter() - start) / (threads * calls) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure rate limiter overhead per request')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--rounds', type=int, default=12, help='bcrypt cost to compare against')
+    args = parser.parse_args()
+
+    same_key = make_limiter()
+    distinct = make_limiter()
+    counter = iter(range(10 ** 9))
+    login = make_limiter()
+
+    rows = (
+        ('one key, repeated', bench(lambda: same_key.hit('login', 'ip', '10.0.0.1'), 50000)),
+        ('new key every call', bench(lambda: distinct.hit('login', 'ip', f'k{next(counter)}'), 50000)),
+        ('login check (ip + user)', bench(lambda: (login.hit('login', 'ip', '10.0.0.1'),
+                                                   login.hit('login', 'username', 'alice')), 50000)),
+        (f'{args.threads} threads, distinct keys', threaded_us(make_limiter(), args.threads, 20000)),
+    )
+
+    hashed, _ = _hash_password('benchmark-password', args.rounds)
+    bcrypt_us = bench(lambda: _check_password(hashed, 'benchmark-password'), 3)
+
+    print("=" * 80)
+    print("RATE LIMITER MICROBENCHMARK")
+    print("=" * 80)
+    print(f"{'case':<32} {'us/check':>10} {'% of bcrypt':>12}")
+    for label, us in rows:
+        print(f"{label:<32} {us:>10.2f} {us / bcrypt_us * 100:>11.4f}%")
+    print(f"{f'bcrypt verify (cost {args.rounds})':<32} {bcrypt_us:>10.0f}")
+    print("=" * 80)
+
+
+if __name__ == '__main__':
+    main()
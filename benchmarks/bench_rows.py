@@ -0,0 +1,117 @@
+"""
+List-view row benchmark: ORM instances vs ORM column rows vs read-only ContactRow tuples
+
+Loads every contact of one user each way and reads every field once, the way a
+template does, reporting wall time, peak traced memory and garbage collections.
+
+    python -m benchmarks.bench_rows --rows 10000,100000
+"""
+import argparse
+import gc
+import os
+import tempfile
+import time
+import tracemalloc
+
+from app import create_app
+from models import (db, User, Contact, CONTACT_LIST_COLUMNS, insert_contacts, live_contacts, read_rows,
+                    upgrade_schema)
+
+
+def orm_objects(user_id):
+    return Contact.query.filter(live_contacts(user_id)).order_by(Contact.id).all()
+
+
+def orm_columns(user_id):
+    return db.session.query(*CONTACT_LIST_COLUMNS).filter(live_contacts(user_id)).order_by(Contact.id).all()
+
+
+def contact_rows(user_id):
+    return list(read_rows(db.select(*CONTACT_LIST_COLUMNS).where(live_contacts(user_id)).order_by(Contact.id)))
+
+
+MODES = {
+    'orm objects': orm_objects,
+    'orm columns': orm_columns,
+    'ContactRow': contact_rows,
+}
+
+
+def consume(rows):
+    """Touch every field of every row"""
+    total = 0
+    for row in rows:
+        total += row.id + len(row.name) + len(row.email) + len(row.phone) + len(row.address)
+    return total
+
+
+def seed(user_id, count, batch=5000):
+    for start in range(0, count, batch):
+        insert_contacts(user_id, [
+            dict(name=f'Contact {i}', email=f'contact{i}@example.com', phone='5550000000',
+                 address=f'{i} Example Street')
+            for i in range(start, min(start + batch, count))
+        ])
+        db.session.commit()
+
+
+def measure(load, user_id, repeat):
+    """Best wall time, peak traced bytes and gen-0..2 collections of one load-and-consume"""
+    best = float('inf')
+    for _ in range(repeat):
+        db.session.remove()
+        start = time.perf_counter()
+        consume(load(user_id))
+        best = min(best, time.perf_counter() - start)
+        db.session.remove()
+
+    gc.collect()
+    before = [stats['collections'] for stats in gc.get_stats()]
+    tracemalloc.start()
+    rows = load(user_id)
+    consume(rows)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    collections = [stats['collections'] - count for stats, count in zip(gc.get_stats(), before)]
+    del rows
+    db.session.remove()
+    return best, peak, collections
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare ORM objects with read-only rows for list views')
+    parser.add_argument('--rows', default='10000,100000', help='Comma-separated contact counts')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed runs per mode; the best is reported')
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        app = create_app({
+            'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(directory, 'bench.db'),
+            'SESSION_BACKEND': 'cookie',
+            'TEMPLATE_WARMUP': False,
+        })
+        with app.app_context():
+            upgrade_schema()
+            for count in map(int, args.rows.split(',')):
+                user = User(username=f'bench{count}', password='x')
+                db.session.add(user)
+                db.session.commit()
+                user_id = user.id
+                seed(user_id, count)
+                results[count] = {name: measure(load, user_id, args.repeat) for name, load in MODES.items()}
+            db.engine.dispose()
+
+    print("=" * 80)
+    print("LIST ROW BENCHMARK - load every contact and read each field once")
+    print("=" * 80)
+    print(f"{'rows':>8}  {'mode':<12} {'ms':>9} {'peak MiB':>9} {'bytes/row':>10} {'gc 0/1/2':>12}")
+    for count, modes in results.items():
+        for name, (seconds, peak, collections) in modes.items():
+            print(f"{count:>8}  {name:<12} {seconds * 1000:>9.1f} {peak / 2 ** 20:>9.1f} "
+                  f"{peak / count:>10.0f} {'/'.join(map(str, collections)):>12}")
+    print("=" * 80)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+Load test: SQLite read/write throughput with default settings vs the tuned pragmas
+
+Readers page through a user's contacts like dashboard() while writers insert
+contacts one commit at a time like contact(). Each configuration gets a fresh
+database file.
+
+    python -m benchmarks.bench_sqlite --readers 8 --writers 2 --seconds 5
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+from functools import partial
+
+from sqlalchemy import create_engine, event, insert, select
+from sqlalchemy.exc import OperationalError
+
+from config import Config
+from models import db, User, Contact, CONTACT_LIST_COLUMNS, apply_sqlite_pragmas, live_contacts
+
+SEED_CONTACTS = 2000
+USERS = 20
+
+
+def make_engine(path, pragmas):
+    engine = create_engine(f'sqlite:///{path}', pool_size=32, max_overflow=0)
+    if pragmas:
+        event.listen(engine, 'connect', partial(apply_sqlite_pragmas, pragmas))
+    db.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [{'username': f'user{i}', 'password': 'x'} for i in range(USERS)])
+        conn.execute(insert(Contact), [
+            {'name': f'Contact {i}', 'email': f'c{i}@example.com', 'phone': '5550000000',
+             'address': '1 Example Street', 'user_id': i % USERS + 1}
+            for i in range(SEED_CONTACTS)
+        ])
+    return engine
+
+
+def run(engine, readers, writers, seconds):
+    """Hammer the engine from reader and writer threads, returning counts per kind"""
+    stop = time.perf_counter() + seconds
+    counts = {'reads': 0, 'writes': 0, 'locked': 0}
+    lock = threading.Lock()
+
+    def reader(worker):
+        done = 0
+        page = (select(*CONTACT_LIST_COLUMNS).where(live_contacts(worker % USERS + 1))
+                .order_by(Contact.id).limit(50))
+        while time.perf_counter() < stop:
+            with engine.connect() as conn:
+                conn.execute(page).all()
+            done += 1
+        with lock:
+            counts['reads'] += done
+
+    def writer(worker):
+        done = locked = 0
+        while time.perf_counter() < stop:
+            try:
+                with engine.begin() as conn:
+                    conn.execute(insert(Contact).values(
+                        name='New Contact', email='new@example.com', phone='5550000001',
+                        address='2 Example Street', user_id=worker % USERS + 1))
+                done += 1
+            except OperationalError:
+                locked += 1
+        with lock:
+            counts['writes'] += done
+            counts['locked'] += locked
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    threads += [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    args = parser.parse_args()
+
+    configurations = (
+        ('default', {}),
+        ('tuned', dict(Config.SQLITE_PRAGMAS)),
+    )
+
+    print("=" * 80)
+    print(f"SQLITE LOAD TEST - {args.readers} readers, {args.writers} writers, {args.seconds:g}s each")
+    print("=" * 80)
+    print(f"{'config':<10} {'reads/s':>10} {'writes/s':>10} {'locked':>8}")
+    with tempfile.TemporaryDirectory() as directory:
+        for name, pragmas in configurations:
+            engine = make_engine(os.path.join(directory, f'{name}.db'), pragmas)
+            counts = run(engine, args.readers, args.writers, args.seconds)
+            engine.dispose()
+            print(f"{name:<10} {counts['reads'] / args.seconds:>10.0f} "
+                  f"{counts['writes'] / args.seconds:>10.0f} {counts['locked']:>8}")
+    print("=" * 80)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+Startup benchmark: import time, app construction and time to first response
+
+Each sample runs in a fresh interpreter, the way a new worker starts during
+autoscaling.
+
+    python -m benchmarks.bench_startup --runs 10
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+CHILD = r'''
+import json, sys, time
+start = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app({'SQLALCHEMY_DATABASE_URI': sys.argv[1], 'SESSION_SQLITE_PATH': sys.argv[2]})
+created = time.perf_counter()
+client = app.test_client()
+status = client.get('/').status_code
+first = time.perf_counter()
+client.get('/login')
+second = time.perf_counter()
+print(json.dumps({
+    'import': imported - start,
+    'create_app': created - imported,
+    'first_response': first - created,
+    'second_response': second - first,
+    'total': first - start,
+    'status': status,
+}))
+'''
+
+PHASES = ('import', 'create_app', 'first_response', 'second_response', 'total')
+
+
+def sample(database_url, session_path):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.run([sys.executable, '-c', CHILD, database_url, session_path], cwd=root,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure cold-start time of the application')
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        database_url = 'sqlite:///' + os.path.join(directory, 'startup.db')
+        session_path = os.path.join(directory, 'sessions.db')
+        samples = [sample(database_url, session_path) for _ in range(args.runs)]
+
+    print("=" * 80)
+    print(f"STARTUP BENCHMARK - {args.runs} fresh interpreter(s)")
+    print("=" * 80)
+    print(f"{'phase':<18} {'median ms':>10} {'min ms':>10} {'max ms':>10}")
+    for phase in PHASES:
+        values = [s[phase] * 1000 for s in samples]
+        print(f"{phase:<18} {statistics.median(values):>10.1f} {min(values):>10.1f} {max(values):>10.1f}")
+    print("=" * 80)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""
+Streaming benchmark: time to first byte, total time, peak memory and bytes sent for
+the all-contacts dashboard, rendered in one piece vs streamed, per content encoding
+
+    python -m benchmarks.bench_streaming --rows 1000,100000
+"""
+import argparse
+import os
+import re
+import tempfile
+import time
+import tracemalloc
+
+from flask import Response, render_template, session
+from flask_wtf.csrf import generate_csrf
+
+from app import compression, create_app
+from models import db, User, CONTACT_LIST_COLUMNS, count_contacts, insert_contacts, iter_contacts, upgrade_schema
+
+ENCODINGS = ('identity', 'gzip', 'br')
+
+
+def make_app(directory):
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(directory, 'bench.db'),
+        'SESSION_SQLITE_PATH': os.path.join(directory, 'sessions.db'),
+        'RATELIMIT_ENABLED': False,
+        'BCRYPT_LOG_ROUNDS': 4,
+        'PASSWORD_POOL_WORKERS': 0,
+        'SLOW_REQUEST_MS': 60000,
+    })
+
+    # The same page rendered into one string before anything is sent
+    @app.route('/bench/buffered')
+    @compression.include
+    def buffered():
+        user_id = session['user_id']
+        contacts = list(iter_contacts(user_id, columns=CONTACT_LIST_COLUMNS))
+        return Response(render_template('dashboard_all.html', contacts=contacts, total=count_contacts(user_id),
+                                        token=generate_csrf()), mimetype='text/html')
+
+    with app.app_context():
+        upgrade_schema()
+    return app
+
+
+def login(client):
+    page = client.get('/register').get_data(as_text=True)
+    token = re.search(r'name="csrf_token"[^>]*value="([^"]+)"', page).group(1)
+    form = {'username': 'bench', 'password': 'bench-password', 'csrf_token': token}
+    client.post('/register', data=form)
+    client.post('/login', data=form)
+    with client.application.app_context():
+        return User.query.filter_by(username='bench').first().id
+
+
+def fetch(client, path, encoding):
+    """(ttfb, total seconds, bytes, peak traced bytes) for one request"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    response = client.get(path, headers={'Accept-Encoding': encoding}, buffered=False)
+    chunks = iter(response.response)
+    size = len(next(chunks, b''))
+    first = time.perf_counter() - start
+    size += sum(len(chunk) for chunk in chunks)
+    total = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    response.close()
+    return first, total, size, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare buffered and streamed rendering of a large dashboard')
+    parser.add_argument('--rows', default='1000,100000', help='Comma-separated contact counts')
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        app = make_app(directory)
+        client = app.test_client()
+        user_id = login(client)
+        seeded = 0
+        for rows in map(int, args.rows.split(',')):
+            with app.app_context():
+                insert_contacts(user_id, [
+                    dict(name=f'Contact {i}', email=f'contact{i}@example.com', phone='5550000000',
+                         address=f'{i} Example Street')
+                    for i in range(seeded, rows)
+                ])
+                db.session.commit()
+                db.engine.dispose()
+            seeded = rows
+            for mode, path in (('buffered', '/bench/buffered'), ('streamed', '/dashboard/all')):
+                for encoding in ENCODINGS:
+                    results.append((rows, mode, encoding) + fetch(client, path, encoding))
+
+    print("=" * 80)
+    print("STREAMING BENCHMARK - all contacts on one page")
+    print("=" * 80)
+    print(f"{'rows':>8} {'mode':<9} {'encoding':<9} {'TTFB ms':>9} {'total ms':>9} {'KiB sent':>10} {'peak MiB':>9}")
+    for rows, mode, encoding, first, total, size, peak in results:
+        print(f"{rows:>8} {mode:<9} {encoding:<9} {first * 1000:>9.1f} {total * 1000:>9.1f} "
+              f"{size / 1024:>10.0f} {peak / 2 ** 20:>9.1f}")
+    print("=" * 80)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""
+Template benchmark: compile cost with and without the bytecode cache, and dashboard
+render time as the contact table grows
+
+The table is rendered three ways to show where the per-row cost goes: as shipped
+(one CSRF placeholder replaced after rendering), with csrf_token() called in every
+row's delete form, and with the delete form left out.
+
+    python -m benchmarks.bench_templates --rows 10,1000,100000
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from collections import namedtuple
+
+from flask import render_template
+from flask_wtf.csrf import generate_csrf
+from jinja2 import FileSystemBytecodeCache
+
+from app import create_app
+from fragments import CSRF_PLACEHOLDER
+from models import ContactPage
+from templating import warm_templates
+
+Row = namedtuple('Row', 'id name email phone address')
+
+
+def timed(function, min_seconds):
+    """Mean seconds per call, repeating until min_seconds have passed"""
+    calls = 0
+    start = time.perf_counter()
+    while True:
+        function()
+        calls += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_seconds:
+            return elapsed / calls
+
+
+def table_variants(env):
+    """The contact table template as shipped, with a per-row csrf_token(), and without forms"""
+    source = env.loader.get_source(env, '_contact_table.html')[0]
+    form_start = source.index('<td>\n                <form')
+    form_end = source.index('</form>', form_start) + len('</form>\n            </td>')
+    return {
+        'placeholder': env.get_template('_contact_table.html'),
+        'csrf_token()': env.from_string(source.replace('{{ csrf_placeholder }}', '{{ csrf_token() }}')),
+        'no form': env.from_string(source[:form_start] + '<td></td>' + source[form_end:]),
+    }
+
+
+def compile_times(app):
+    """Seconds to load every template cold, and again from a populated bytecode cache"""
+    directory = tempfile.mkdtemp()
+    try:
+        results = {}
+        for label in ('compile', 'bytecode cache'):
+            env = app.jinja_env.overlay(cache_size=400, bytecode_cache=FileSystemBytecodeCache(directory))
+            start = time.perf_counter()
+            count = warm_templates(env)
+            results[label] = time.perf_counter() - start
+        return count, results
+    finally:
+        shutil.rmtree(directory)
+
+
+def render_times(app, rows, min_seconds):
+    """Seconds per full dashboard render for each table variant"""
+    contacts = [Row(i, f'Contact {i}', f'contact{i}@example.com', '5550000000', f'{i} Example Street')
+                for i in range(1, rows + 1)]
+    page = ContactPage(contacts, has_prev=False, has_next=True, offset=0)
+    context = {'contacts': contacts, 'page': page, 'total': rows, 'csrf_placeholder': CSRF_PLACEHOLDER}
+
+    results = {}
+    with app.test_request_context('/dashboard'):
+        token = generate_csrf()
+        for label, template in table_variants(app.jinja_env).items():
+            def render():
+                table = template.render(context)
+                if label == 'placeholder':
+                    table = table.replace(CSRF_PLACEHOLDER, token)
+                return render_template('dashboard.html', contact_table=table)
+            results[label] = timed(render, min_seconds)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time template compilation and dashboard rendering')
+    parser.add_argument('--rows', default='10,1000,100000', help='Comma-separated contact counts')
+    parser.add_argument('--seconds', type=float, default=1.0, help='Minimum time spent on each measurement')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        app = create_app({
+            'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(directory, 'bench.db'),
+            'SESSION_BACKEND': 'cookie',
+            'TEMPLATE_BYTECODE_CACHE_DIR': '',
+            'TEMPLATE_WARMUP': False,
+        })
+        count, compiled = compile_times(app)
+        renders = {rows: render_times(app, rows, args.seconds) for rows in map(int, args.rows.split(','))}
+
+    print("=" * 80)
+    print(f"TEMPLATE BENCHMARK - {count} template(s)")
+    print("=" * 80)
+    for label, seconds in compiled.items():
+        print(f"Load all templates, {label:<16} {seconds * 1000:>8.1f} ms")
+    print()
+    variants = list(next(iter(renders.values())))
+    print(f"{'rows':>8}  " + "  ".join(f"{label + ' ms':>16}" for label in variants) + f"  {'us/row':>8}")
+    for rows, results in renders.items():
+        per_row = results['placeholder'] / rows * 1e6
+        print(f"{rows:>8}  " + "  ".join(f"{results[label] * 1000:>16.2f}" for label in variants)
+              + f"  {per_row:>8.2f}")
+    print("=" * 80)
+
+
+if __name__ == '__main__':
+    main()
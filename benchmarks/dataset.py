@@ -0,0 +1,110 @@
+"""
+Seeded synthetic dataset: users and contacts at a chosen scale, identical for a given seed
+
+Every user gets the same password, so any of them can log in, and the same number of
+contacts. Build a database file once and reuse it across benchmark runs:
+
+    python -m benchmarks.dataset --users 1000 --contacts 10 --output bench.db
+    python -m benchmarks.dataset --users 10000 --contacts 10000 --output large.db --seed 7
+"""
+import argparse
+import os
+import random
+import time
+
+from app import create_app, hasher
+from models import db, Contact, User, upgrade_schema
+
+PASSWORD = 'benchmark-password'
+
+FIRST_NAMES = ('Ada', 'Alan', 'Barbara', 'Claude', 'Dennis', 'Donald', 'Edsger', 'Frances', 'Grace',
+               'John', 'Ken', 'Leslie', 'Linus', 'Margaret', 'Niklaus', 'Radia', 'Sophie', 'Tim')
+LAST_NAMES = ('Allen', 'Backus', 'Dijkstra', 'Hamilton', 'Hopper', 'Kernighan', 'Knuth', 'Lamport',
+              'Liskov', 'Lovelace', 'Perlman', 'Ritchie', 'Shannon', 'Thompson', 'Turing', 'Wirth')
+STREETS = ('High Street', 'Station Road', 'Church Lane', 'Mill Road', 'Park Avenue', 'Victoria Road')
+DOMAINS = ('example.com', 'example.org', 'example.net')
+
+
+def username(index):
+    """Username of the index-th generated user"""
+    return f'user{index:06d}'
+
+
+def contact_rows(rng, count):
+    """count contact dicts drawn from rng"""
+    rows = []
+    for _ in range(count):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        rows.append(dict(
+            name=f'{first} {last}',
+            email=f'{first}.{last}{rng.randrange(10000)}@{rng.choice(DOMAINS)}'.lower(),
+            phone=f'555{rng.randrange(10 ** 7):07d}',
+            address=f'{rng.randrange(1, 1000)} {rng.choice(STREETS)}',
+        ))
+    return rows
+
+
+def generate(users, contacts, password_hash, seed=0, batch_size=10000, progress=None):
+    """Create users and contacts in the current app's database, committing in batches.
+
+    The same seed always produces the same rows. User ids run from 1 to users in
+    username order; progress, if given, is called with the number of users written.
+    """
+    upgrade_schema()
+    rng = random.Random(seed)
+    # Whole users per transaction, at least one even when they have many contacts
+    users_per_batch = max(1, batch_size // max(contacts, 1))
+    for start in range(0, users, users_per_batch):
+        stop = min(users, start + users_per_batch)
+        ids = db.session.execute(
+            db.insert(User).returning(User.id, sort_by_parameter_order=True),
+            [dict(username=username(i), password=password_hash) for i in range(start, stop)]).scalars().all()
+        for user_id in ids:
+            for offset in range(0, contacts, batch_size):
+                rows = contact_rows(rng, min(batch_size, contacts - offset))
+                db.session.execute(db.insert(Contact), [dict(row, user_id=user_id) for row in rows])
+        db.session.commit()
+        if progress is not None:
+            progress(stop)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Write a seeded users-and-contacts database for benchmarking')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--contacts', type=int, default=10, help='Contacts per user')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--bcrypt-rounds', type=int, default=4, help='Cost of the shared password hash')
+    parser.add_argument('--output', default='bench.db', help='SQLite file to create')
+    args = parser.parse_args()
+
+    if os.path.exists(args.output):
+        parser.error(f'{args.output} already exists')
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.abspath(args.output),
+        'SESSION_BACKEND': 'cookie',
+        'PASSWORD_POOL_WORKERS': 0,
+        'TEMPLATE_WARMUP': False,
+        'CONTACT_PURGE_INTERVAL': 0,
+    })
+
+    print("=" * 80)
+    print(f"DATASET - {args.users} users x {args.contacts} contacts, seed {args.seed} -> {args.output}")
+    print("=" * 80)
+    start = time.perf_counter()
+    shown = [start]
+
+    def progress(done):
+        now = time.perf_counter()
+        if done == args.users or now - shown[0] >= 5:
+            shown[0] = now
+            print(f"  {done:>8} users  {done * args.contacts:>12} contacts  {now - start:>8.1f}s")
+
+    with app.app_context():
+        generate(args.users, args.contacts, hasher.generate_password_hash(PASSWORD, args.bcrypt_rounds),
+                 seed=args.seed, progress=progress)
+        db.engine.dispose()
+    print("=" * 80)
+
+
+if __name__ == '__main__':
+    main()
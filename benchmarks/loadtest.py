@@ -0,0 +1,220 @@
+"""
+Concurrent load generator that replays realistic user sessions
+
+Each virtual user registers, logs in with a CSRF token, adds contacts, views
+the dashboard, deletes a contact and logs out. Sessions run on a thread pool
+either in-process against the Flask test client or over HTTP against a
+running server, and latency percentiles and throughput are reported per route.
+
+    python -m benchmarks.loadtest --users 8 --sessions 40
+    python -m benchmarks.loadtest --url http://localhost:5000 --users 16 --sessions 200
+
+Start the server with RATELIMIT_ENABLED=0 for HTTP runs, since every virtual user
+comes from the same address.
+"""
+import argparse
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+CSRF_TOKEN = re.compile(r'name="csrf_token"[^>]*value="([^"]+)"')
+DELETE_ACTION = re.compile(r'action="/delete/(\d+)"')
+
+
+class TestClientTarget(object):
+    """Sends requests to an in-process app through its test client"""
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, data=None):
+        response = self.client.open(path, method=method, data=data)
+        return response.status_code, response.get_data(as_text=True)
+
+
+class HttpTarget(object):
+    """Sends requests to a running server, keeping cookies for the session"""
+    def __init__(self, base_url, timeout=30):
+        import requests
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def request(self, method, path, data=None):
+        response = self.session.request(method, self.base_url + path, data=data,
+                                        allow_redirects=False, timeout=self.timeout)
+        return response.status_code, response.text
+
+
+class RouteStats(object):
+    """Latencies and failures recorded for one route"""
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+
+    def percentile(self, percent):
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        index = max(0, min(len(ordered) - 1, int(round(percent / 100.0 * len(ordered))) - 1))
+        return ordered[index]
+
+
+class LoadReport(object):
+    """Collects timings from every virtual user"""
+    def __init__(self):
+        self.routes = {}
+        self.sessions = 0
+        self.failed_sessions = 0
+        self.elapsed = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, route, seconds, ok):
+        with self._lock:
+            stats = self.routes.setdefault(route, RouteStats())
+            stats.latencies.append(seconds)
+            stats.errors += not ok
+
+    def summary(self):
+        """Per-route numbers as plain data, latencies in milliseconds"""
+        rows = {}
+        for route, stats in sorted(self.routes.items()):
+            rows[route] = {
+                'requests': len(stats.latencies),
+                'errors': stats.errors,
+                'throughput': len(stats.latencies) / self.elapsed if self.elapsed else 0.0,
+                'p50_ms': stats.percentile(50) * 1000,
+                'p95_ms': stats.percentile(95) * 1000,
+                'p99_ms': stats.percentile(99) * 1000,
+            }
+        return rows
+
+    def print_table(self):
+        print(f"{'route':<24} {'reqs':>6} {'errors':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+        for route, row in self.summary().items():
+            print(f"{route:<24} {row['requests']:>6} {row['errors']:>6} {row['throughput']:>8.1f} "
+                  f"{row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f}")
+        total = sum(len(stats.latencies) for stats in self.routes.values())
+        print(f"\n{self.sessions} session(s), {self.failed_sessions} failed, "
+              f"{total} request(s) in {self.elapsed:.2f}s ({total / self.elapsed if self.elapsed else 0:.1f} req/s)")
+
+
+class SessionScript(object):
+    """One virtual user's visit, timing every request"""
+    def __init__(self, target, report, contacts=3):
+        self.target = target
+        self.report = report
+        self.contacts = contacts
+
+    def call(self, method, path, route, data=None, expect=(200, 302)):
+        start = time.perf_counter()
+        status, body = self.target.request(method, path, data)
+        ok = status in expect
+        self.report.record(route, time.perf_counter() - start, ok)
+        if not ok:
+            raise RuntimeError(f'{route} returned {status}')
+        return body
+
+    def token(self, path, route):
+        match = CSRF_TOKEN.search(self.call('GET', path, route))
+        return match.group(1) if match else ''
+
+    def run(self):
+        username = 'load' + uuid.uuid4().hex[:12]
+        password = 'load-test-' + uuid.uuid4().hex
+
+        token = self.token('/register', 'GET /register')
+        self.call('POST', '/register', 'POST /register',
+                  {'csrf_token': token, 'username': username, 'password': password})
+
+        token = self.token('/login', 'GET /login')
+        self.call('POST', '/login', 'POST /login', {'csrf_token': token, 'username': username,
+                                                    'password': password}, expect=(302,))
+
+        for i in range(self.contacts):
+            token = self.token('/contact', 'GET /contact')
+            self.call('POST', '/contact', 'POST /contact', {
+                'csrf_token': token, 'name': f'Load Contact {i}', 'email': f'load{i}@example.com',
+                'phone': '5550000000', 'address': f'{i} Load Test Street'}, expect=(302,))
+
+        dashboard = self.call('GET', '/dashboard', 'GET /dashboard')
+        ids = DELETE_ACTION.findall(dashboard)
+        token = CSRF_TOKEN.search(dashboard)
+        if ids and token:
+            self.call('POST', f'/delete/{ids[0]}', 'POST /delete/<id>',
+                      {'csrf_token': token.group(1)}, expect=(302,))
+
+        self.call('GET', '/logout', 'GET /logout', expect=(302,))
+
+
+def run_load(make_target, users=4, sessions=20, contacts=3):
+    """Run sessions on a pool of users concurrent threads and return the report"""
+    report = LoadReport()
+
+    def one_session(_):
+        try:
+            SessionScript(make_target(), report, contacts).run()
+            return True
+        except Exception:
+            return False
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users) as pool:
+        results = list(pool.map(one_session, range(sessions)))
+    report.elapsed = time.perf_counter() - start
+    report.sessions = len(results)
+    report.failed_sessions = results.count(False)
+    return report
+
+
+def in_process_target_factory(database_url=None, bcrypt_rounds=4):
+    """Build the app against a scratch database and return a target factory"""
+    from app import create_app
+    from models import upgrade_schema
+
+    scratch = tempfile.mkdtemp()
+    if database_url is None:
+        database_url = 'sqlite:///' + os.path.join(scratch, 'loadtest.db')
+    # Every virtual user shares one address, so login throttling would stop the run
+    app = create_app({'SQLALCHEMY_DATABASE_URI': database_url, 'BCRYPT_LOG_ROUNDS': bcrypt_rounds,
+                      'SESSION_SQLITE_PATH': os.path.join(scratch, 'sessions.db'), 'RATELIMIT_ENABLED': False})
+    with app.app_context():
+        upgrade_schema()
+    return lambda: TestClientTarget(app)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay concurrent user sessions and report latency per route')
+    parser.add_argument('--url', help='Base URL of a running server; runs in-process when omitted')
+    parser.add_argument('--users', type=int, default=4, help='Concurrent virtual users')
+    parser.add_argument('--sessions', type=int, default=20, help='Total sessions to run')
+    parser.add_argument('--contacts', type=int, default=3, help='Contacts added per session')
+    parser.add_argument('--bcrypt-rounds', type=int, default=4,
+                        help='bcrypt cost for in-process runs (the server decides over HTTP)')
+    parser.add_argument('--json', help='Also write the per-route summary to this file')
+    args = parser.parse_args()
+
+    if args.url:
+        make_target = lambda: HttpTarget(args.url)  # noqa: E731
+    else:
+        make_target = in_process_target_factory(bcrypt_rounds=args.bcrypt_rounds)
+
+    print("=" * 80)
+    print(f"LOAD TEST - {args.users} users, {args.sessions} sessions against {args.url or 'in-process app'}")
+    print("=" * 80)
+    report = run_load(make_target, args.users, args.sessions, args.contacts)
+    report.print_table()
+    print("=" * 80)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'elapsed': report.elapsed, 'sessions': report.sessions,
+                       'failed_sessions': report.failed_sessions, 'routes': report.summary()}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
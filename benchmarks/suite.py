@@ -0,0 +1,392 @@
+"""
+Benchmark suite: microbenchmarks of the validators, templates, password checks and model
+queries, and macrobenchmarks of every page through the test client, run against a
+seeded dataset and written to a JSON file that later runs can be compared with
+
+    python -m benchmarks.suite run --users 1000 --contacts 10 --output baseline.json
+    python -m benchmarks.suite run --database large.db --output current.json --baseline baseline.json
+    python -m benchmarks.suite compare baseline.json current.json --threshold 0.10
+
+Microbenchmarks run in batches with the garbage collector off, like timeit, until
+--seconds have passed. Each macrobenchmark sends --requests requests after a short
+warm-up and times each one. Comparisons use the median; a benchmark more than
+--threshold slower than the baseline is a regression and makes the exit status 1.
+"""
+import argparse
+import fnmatch
+import gc
+import json
+import os
+import platform
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from flask import render_template
+from werkzeug.datastructures import MultiDict
+
+from app import create_app, hasher, usernames
+from benchmarks.dataset import PASSWORD, generate, username
+from forms import LoginForm, clean_text, scan_input, validate_contact_data
+from fragments import CSRF_PLACEHOLDER
+from models import (db, User, contact_page, count_contacts, create_api_token, insert_contacts, iter_contacts,
+                    search_contacts, CONTACT_LIST_COLUMNS)
+
+CSRF_TOKEN = re.compile(r'name="csrf_token"[^>]*value="([^"]+)"')
+
+SHORT_INPUT = 'Jane Doe'
+LONG_INPUT = ('Flat 12, Riverside Court, 221 Long Meadow Road, Little Whinging, Surrey, United Kingdom - '
+              'please leave parcels with the <b>concierge</b> at the front desk; call ahead on weekends.')
+NEW_CONTACT = {'name': 'Suite Contact', 'email': 'suite@example.com', 'phone': '5550000000',
+               'address': '1 Benchmark Street'}
+
+
+def summarise(samples, calls):
+    """Timing statistics in microseconds from per-call seconds"""
+    ordered = sorted(samples)
+    median = statistics.median(ordered)
+    return {
+        'calls': calls,
+        'mean_us': statistics.fmean(ordered) * 1e6,
+        'median_us': median * 1e6,
+        'p95_us': ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1e6,
+        'min_us': ordered[0] * 1e6,
+        'ops_per_sec': 1 / median if median else 0.0,
+    }
+
+
+def measure_micro(function, seconds, samples=7):
+    """Per-call seconds from samples batches sized so the whole run takes about seconds"""
+    function()  # Once untimed, so first-call setup doesn't skew the batch size
+    number, elapsed = 1, 0.0
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        elapsed = time.perf_counter() - start
+        if elapsed >= seconds / samples / 2 or number >= 1 << 24:
+            break
+        number *= 2
+    number = max(1, int(number * seconds / samples / max(elapsed, 1e-9)))
+
+    results = []
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(samples):
+            start = time.perf_counter()
+            for _ in range(number):
+                function()
+            results.append((time.perf_counter() - start) / number)
+    finally:
+        if enabled:
+            gc.enable()
+    return summarise(results, number * samples)
+
+
+def measure_macro(page, requests, warmup):
+    """Seconds for each of requests calls, after warmup untimed ones"""
+    for _ in range(warmup):
+        page()
+        page.finish()
+    results = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        page()
+        results.append(time.perf_counter() - start)
+        page.finish()
+    return summarise(results, requests)
+
+
+class Page(object):
+    """One route requested through a test client, checking the status code.
+
+    path and data may be callables, to vary them from request to request.
+    """
+    def __init__(self, client, method, path, data=None, expect=200, headers=None):
+        self.client = client
+        self.method = method
+        self.path = path
+        self.data = data
+        self.expect = expect
+        self.headers = headers
+        self.location = None
+
+    def __call__(self):
+        path = self.path() if callable(self.path) else self.path
+        data = self.data() if callable(self.data) else self.data
+        response = self.client.open(path, method=self.method, data=data, headers=self.headers)
+        response.get_data()
+        if response.status_code != self.expect:
+            raise RuntimeError(f'{self.method} {path} returned {response.status_code}, expected {self.expect}')
+        self.location = response.location
+
+    def finish(self):
+        """Untimed: follow a redirect as a browser would, which also shows and clears the flashed message"""
+        if self.location:
+            self.client.get(self.location).get_data()
+            self.location = None
+
+
+class Fixture(object):
+    """The app, a seeded database and logged-in clients to benchmark with"""
+    def __init__(self, directory, args):
+        database = os.path.join(directory, 'suite.db')
+        if args.database:
+            # Benchmarks write, so work on a copy and leave the generated file as it was
+            shutil.copyfile(args.database, database)
+        self.app = create_app({
+            'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + database,
+            'SESSION_SQLITE_PATH': os.path.join(directory, 'sessions.db'),
+            'TEMPLATE_BYTECODE_CACHE_DIR': os.path.join(directory, 'jinja'),
+            'BCRYPT_LOG_ROUNDS': args.bcrypt_rounds,
+            'PASSWORD_POOL_WORKERS': 0,
+            'RATELIMIT_ENABLED': False,
+            'CONTACT_PURGE_INTERVAL': 0,
+            'SLOW_REQUEST_MS': 60000,
+        })
+        with self.app.app_context():
+            if not args.database:
+                generate(args.users, args.contacts, hasher.generate_password_hash(PASSWORD), seed=args.seed)
+            self.users = db.session.query(User).count()
+            # Reads as the first user; writes as the second, so the pages read don't change
+            self.reader_id = User.query.filter_by(username=username(0)).one().id
+            self.writer_id = User.query.filter_by(username=username(1)).one().id
+            self.contacts = count_contacts(self.reader_id)
+            self.api_token = create_api_token(self.reader_id, 'benchmark suite')
+            # One contact for every delete the suite will send
+            self.deletable = insert_contacts(self.writer_id, [NEW_CONTACT] * (args.requests + args.warmup),
+                                             returning=True)
+            db.session.commit()
+
+        self.reader = self.logged_in(username(0))
+        self.writer = self.logged_in(username(1))
+        self.visitor = self.client()
+
+    def client(self):
+        """A test client with a session and the CSRF token that goes with it"""
+        client = self.app.test_client()
+        page = client.get('/login').get_data(as_text=True)
+        client.csrf_token = CSRF_TOKEN.search(page).group(1)
+        return client
+
+    def logged_in(self, name):
+        client = self.client()
+        form = {'username': name, 'password': PASSWORD, 'csrf_token': client.csrf_token}
+        if client.post('/login', data=form).status_code != 302:
+            raise RuntimeError(f'Could not log in as {name}')
+        return client
+
+
+def micro_benchmarks(fixture):
+    """(name, function) pairs run inside one request context"""
+    reader_id = fixture.reader_id
+    login_form = MultiDict({'username': username(0), 'password': PASSWORD})
+    hashed = hasher.generate_password_hash(PASSWORD)
+    page = contact_page(reader_id, per_page=50)
+    table_context = {'contacts': page.rows, 'page': page, 'total': fixture.contacts,
+                     'csrf_placeholder': CSRF_PLACEHOLDER}
+    last_id = page.rows[-1].id if page.rows else None
+    # Time the filter, not the database lookups that stand in for it while it builds
+    usernames.wait()
+    return [
+        ('validators.scan_input short', lambda: scan_input(SHORT_INPUT)),
+        ('validators.scan_input long', lambda: scan_input(LONG_INPUT)),
+        ('validators.clean_text long', lambda: clean_text(LONG_INPUT)),
+        ('forms.LoginForm.validate', lambda: LoginForm(formdata=login_form, meta={'csrf': False}).validate()),
+        ('forms.validate_contact_data', lambda: validate_contact_data(NEW_CONTACT)),
+        ('passwords.check_password_hash', lambda: hasher.check_password_hash(hashed, PASSWORD)),
+        ('templates.login', lambda: render_template('login.html', form=LoginForm(formdata=None))),
+        ('templates.contact_table 50 rows', lambda: render_template('_contact_table.html', **table_context)),
+        ('templates.dashboard', lambda: render_template('dashboard.html', contact_table='')),
+        ('models.count_contacts', lambda: count_contacts(reader_id)),
+        ('models.contact_page first', lambda: contact_page(reader_id, per_page=50)),
+        ('models.contact_page next', lambda: contact_page(reader_id, after=last_id, per_page=50)),
+        ('models.iter_contacts all', lambda: sum(1 for _ in iter_contacts(reader_id, columns=CONTACT_LIST_COLUMNS))),
+        ('models.search_contacts', lambda: search_contacts(reader_id, 'Turing')),
+        ('usernames.is_available', lambda: usernames.is_available('nobody-by-this-name')),
+    ]
+
+
+def macro_benchmarks(fixture):
+    """(name, Page) pairs, each sending one request"""
+    reader, writer, visitor = fixture.reader, fixture.writer, fixture.visitor
+    signing_in, registering = fixture.client(), fixture.client()
+    deletable = iter(fixture.deletable)
+    registered = iter(range(sys.maxsize))
+    checked = iter(range(sys.maxsize))
+    users = fixture.users
+    bearer = {'Authorization': f'Bearer {fixture.api_token}'}
+    return [
+        ('GET /', Page(visitor, 'GET', '/')),
+        ('GET /login', Page(visitor, 'GET', '/login')),
+        ('POST /login', Page(signing_in, 'POST', '/login', data={
+            'username': username(0), 'password': PASSWORD, 'csrf_token': signing_in.csrf_token}, expect=302)),
+        ('GET /register', Page(visitor, 'GET', '/register')),
+        ('POST /register', Page(registering, 'POST', '/register', data=lambda: {
+            'username': f'suite{next(registered):06d}', 'password': PASSWORD,
+            'csrf_token': registering.csrf_token}, expect=302)),
+        ('GET /register/check', Page(visitor, 'GET',
+                                     lambda: f'/register/check?username={username(next(checked) % users)}')),
+        ('GET /dashboard', Page(reader, 'GET', '/dashboard')),
+        ('GET /dashboard/all', Page(reader, 'GET', '/dashboard/all')),
+        ('GET /search', Page(reader, 'GET', '/search?q=Turing')),
+        ('GET /contact', Page(writer, 'GET', '/contact')),
+        ('POST /contact', Page(writer, 'POST', '/contact', data=dict(NEW_CONTACT, csrf_token=writer.csrf_token),
+                               expect=302)),
+        ('POST /delete/<id>', Page(writer, 'POST', lambda: f'/delete/{next(deletable)}',
+                                   data={'csrf_token': writer.csrf_token}, expect=302)),
+        ('GET /contacts/export.csv', Page(reader, 'GET', '/contacts/export.csv')),
+        ('GET /api/v1/contacts', Page(visitor, 'GET', '/api/v1/contacts', headers=bearer)),
+    ]
+
+
+def selected(name, patterns):
+    return not patterns or any(fnmatch.fnmatchcase(name, pattern) for pattern in patterns)
+
+
+def revision():
+    """Short git commit of the tree being measured, if there is one"""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(args):
+    patterns = [pattern for pattern in (args.only or '').split(',') if pattern]
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        fixture = Fixture(directory, args)
+        if args.kind in ('all', 'micro'):
+            with fixture.app.test_request_context('/dashboard'):
+                for name, function in micro_benchmarks(fixture):
+                    if selected(name, patterns):
+                        results[name] = dict(measure_micro(function, args.seconds), kind='micro')
+                        print_result(name, results[name])
+                db.session.remove()
+        if args.kind in ('all', 'macro'):
+            for name, page in macro_benchmarks(fixture):
+                if selected(name, patterns):
+                    results[name] = dict(measure_macro(page, args.requests, args.warmup), kind='macro')
+                    print_result(name, results[name])
+        with fixture.app.app_context():
+            db.engine.dispose()
+
+    return {
+        'meta': {
+            'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'revision': revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'dataset': {'users': fixture.users, 'contacts_per_user': fixture.contacts,
+                        'source': os.path.basename(args.database) if args.database else f'seed {args.seed}'},
+            'bcrypt_rounds': args.bcrypt_rounds,
+            'requests': args.requests,
+            'seconds': args.seconds,
+        },
+        'results': results,
+    }
+
+
+def print_result(name, row):
+    print(f"{name:<36} {row['kind']:<6} {row['calls']:>9} {row['median_us']:>12.1f} "
+          f"{row['p95_us']:>12.1f} {row['ops_per_sec']:>10.1f}")
+
+
+def compare(baseline, current, threshold):
+    """Print the change in median per benchmark and return the names that regressed"""
+    for key in ('dataset', 'bcrypt_rounds', 'python'):
+        if baseline['meta'].get(key) != current['meta'].get(key):
+            print(f"warning: {key} differs: {baseline['meta'].get(key)} vs {current['meta'].get(key)}")
+
+    regressions = []
+    print(f"{'benchmark':<36} {'baseline us':>12} {'current us':>12} {'change':>8}")
+    for name, row in current['results'].items():
+        before = baseline['results'].get(name)
+        if before is None:
+            print(f"{name:<36} {'-':>12} {row['median_us']:>12.1f} {'new':>8}")
+            continue
+        change = row['median_us'] / before['median_us'] - 1
+        flag = ''
+        if change > threshold:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        elif change < -threshold:
+            flag = '  improved'
+        print(f"{name:<36} {before['median_us']:>12.1f} {row['median_us']:>12.1f} {change:>+8.1%}{flag}")
+    for name in baseline['results']:
+        if name in current['results']:
+            continue
+        print(f"{name:<36} {baseline['results'][name]['median_us']:>12.1f} {'-':>12} {'missing':>8}")
+    return regressions
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the benchmark suite or compare two result files')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help='Seed a dataset, run the benchmarks and write the results')
+    run.add_argument('--users', type=int, default=1000, help='Users to generate')
+    run.add_argument('--contacts', type=int, default=10, help='Contacts per generated user')
+    run.add_argument('--seed', type=int, default=0)
+    run.add_argument('--database', help='Copy of a database from benchmarks.dataset to use instead of generating one')
+    run.add_argument('--kind', choices=('all', 'micro', 'macro'), default='all')
+    run.add_argument('--only', help='Comma-separated name patterns, e.g. "forms.*,POST *"')
+    run.add_argument('--seconds', type=float, default=0.5, help='Time spent on each microbenchmark')
+    run.add_argument('--requests', type=int, default=100, help='Timed requests per macrobenchmark')
+    run.add_argument('--warmup', type=int, default=5, help='Untimed requests before each macrobenchmark')
+    run.add_argument('--bcrypt-rounds', type=int, default=4)
+    run.add_argument('--output', default='benchmark-results.json')
+    run.add_argument('--baseline', help='Results file to compare with once the run finishes')
+    run.add_argument('--threshold', type=float, default=0.10, help='Slowdown of the median that counts as a regression')
+
+    check = commands.add_parser('compare', help='Compare two result files')
+    check.add_argument('baseline')
+    check.add_argument('current')
+    check.add_argument('--threshold', type=float, default=0.10, help='Slowdown of the median that counts as a regression')
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        # Read first, in case the baseline is about to be overwritten
+        baseline = load(args.baseline) if args.baseline else None
+        print("=" * 80)
+        source = args.database or f'{args.users} users x {args.contacts} contacts, seed {args.seed}'
+        print(f"BENCHMARK SUITE - {source}")
+        print("=" * 80)
+        print(f"{'benchmark':<36} {'kind':<6} {'calls':>9} {'median us':>12} {'p95 us':>12} {'ops/s':>10}")
+        report = run_suite(args)
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nWrote {len(report['results'])} result(s) to {args.output}")
+        if baseline is None:
+            print("=" * 80)
+            return
+        current = report
+    else:
+        baseline, current = load(args.baseline), load(args.current)
+
+    print("=" * 80)
+    print(f"COMPARISON - regression threshold {args.threshold:.0%}")
+    print("=" * 80)
+    regressions = compare(baseline, current, args.threshold)
+    print("=" * 80)
+    if regressions:
+        print(f"✗ {len(regressions)} regression(s): {', '.join(regressions)}")
+        sys.exit(1)
+    print("✓ No regressions")
+
+
+if __name__ == '__main__':
+    main()
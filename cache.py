@@ -0,0 +1,71 @@
+"""
+Thread-safe in-process LRU cache with optional size cap and TTL
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache(object):
+    """Least-recently-used cache bounded by entry count and/or total size"""
+    def __init__(self, max_entries=None, max_bytes=None, ttl=None, sizeof=len):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.sizeof = sizeof
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None and self.ttl is not None and time.monotonic() - item[2] > self.ttl:
+                self._remove(key)
+                item = None
+            if item is None:
+                self.misses += 1
+                return default
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def set(self, key, value):
+        size = self.sizeof(value) if self.max_bytes is not None else 0
+        if self.max_bytes is not None and size > self.max_bytes:
+            # Never worth evicting everything else for one oversized value
+            self.pop(key)
+            return
+        with self._lock:
+            if key in self._items:
+                self._remove(key)
+            self._items[key] = (value, size, time.monotonic())
+            self.bytes += size
+            while ((self.max_entries is not None and len(self._items) > self.max_entries)
+                   or (self.max_bytes is not None and self.bytes > self.max_bytes)):
+                oldest = next(iter(self._items))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def pop(self, key, default=None):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return default
+            self._remove(key)
+            return item[0]
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.bytes = 0
+
+    def _remove(self, key):
+        _, size, _ = self._items.pop(key)
+        self.bytes -= size
@@ -0,0 +1,90 @@
+"""
+HTTP caching: validators for rendered pages and fingerprinted static asset URLs
+"""
+import hashlib
+import os
+from functools import wraps
+
+from flask import current_app, make_response, request, session, url_for
+
+from metrics import registry
+
+not_modified_total = registry.counter('http_not_modified_total', 'Conditional GETs answered with 304', ['endpoint'])
+
+
+def file_digest(path):
+    """Short content hash of one file"""
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()[:12]
+
+
+def tree_digest(*directories):
+    """Content hash of every file under the given directories"""
+    digest = hashlib.sha1()
+    for directory in directories:
+        for root, dirs, files in os.walk(directory):
+            dirs.sort()
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                digest.update(os.path.relpath(path, directory).encode())
+                with open(path, 'rb') as f:
+                    digest.update(f.read())
+    return digest.hexdigest()[:12]
+
+
+def init_caching(app):
+    """Fix the revision that page ETags are derived from and register static_url()"""
+    if not app.config.get('APP_REVISION'):
+        # Without a deploy-provided revision, any template or asset change starts a new one
+        app.config['APP_REVISION'] = tree_digest(os.path.join(app.root_path, app.template_folder),
+                                                 app.static_folder)
+    app.extensions['asset_digests'] = {}
+    app.add_template_global(static_url)
+
+
+def static_url(filename):
+    """URL of a static file carrying its content hash, so it can be cached for a year"""
+    digests = current_app.extensions['asset_digests']
+    digest = digests.get(filename)
+    if digest is None:
+        digest = digests[filename] = file_digest(os.path.join(current_app.static_folder, filename))
+    return url_for('static', filename=filename, v=digest)
+
+
+def page_etag(revision):
+    """Validator for everything a page depends on besides pending flash messages"""
+    parts = (current_app.config['APP_REVISION'], request.full_path, session.get('user_id'),
+             session.get('username'), session.get('csrf_token'), revision)
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
+def conditional(revision=None):
+    """Answer repeat GETs of an unchanged page with 304 before the view runs.
+
+    revision is called to get whatever data version the page shows, e.g. the
+    user's contact version. ETags are weak because each render signs the CSRF
+    token afresh, which changes the bytes but not the meaning of the page.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            # Pending flashes are shown once, so those pages are never reused
+            if request.method != 'GET' or '_flashes' in session:
+                return view(*args, **kwargs)
+
+            version = revision() if revision is not None else None
+            if request.if_none_match.contains_weak(page_etag(version)):
+                not_modified_total.inc(endpoint=request.endpoint)
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200 or '_flashes' in session:
+                    return response
+
+            # Recomputed because rendering may have created the session's CSRF token
+            response.set_etag(page_etag(version), weak=True)
+            response.headers['Cache-Control'] = 'private, no-cache'
+            response.vary.add('Cookie')
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,177 @@
+"""
+Response compression negotiated from Accept-Encoding, for whole and streamed bodies
+"""
+import zlib
+
+from flask import Blueprint, current_app, request
+
+from metrics import registry
+
+try:
+    import brotli
+except ImportError:  # optional: pip install -r requirements-compression.txt
+    brotli = None
+
+bytes_in = registry.counter('compression_input_bytes_total', 'Response bytes before compression', ['encoding'])
+bytes_out = registry.counter('compression_output_bytes_total', 'Response bytes sent compressed', ['encoding'])
+
+COMPRESSIBLE_MIMETYPES = frozenset((
+    'text/html', 'text/css', 'text/plain', 'text/csv', 'application/json', 'application/x-ndjson',
+    'application/javascript', 'image/svg+xml',
+))
+
+
+class GzipStream(object):
+    """Incremental gzip whose flush() emits everything written so far"""
+    def __init__(self, level):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class BrotliStream(object):
+    """Incremental brotli with the same interface as GzipStream"""
+    def __init__(self, quality):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+def coalesce(chunks, size):
+    """Join small chunks, e.g. from a template stream, into pieces of at least size characters.
+
+    The first chunk is passed on at once so the page starts arriving immediately.
+    """
+    buffer, buffered = [], 0
+    first = True
+    for chunk in chunks:
+        buffer.append(chunk)
+        buffered += len(chunk)
+        if first or buffered >= size:
+            yield ''.join(buffer)
+            buffer, buffered = [], 0
+            first = False
+    if buffer:
+        yield ''.join(buffer)
+
+
+def compress_chunks(chunks, stream, encoding):
+    """Compress a streamed body, flushing after every chunk so nothing waits in the compressor"""
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        if not chunk:
+            continue
+        data = stream.compress(chunk) + stream.flush()
+        bytes_in.inc(len(chunk), encoding=encoding)
+        bytes_out.inc(len(data), encoding=encoding)
+        yield data
+    tail = stream.finish()
+    bytes_out.inc(len(tail), encoding=encoding)
+    yield tail
+
+
+class Compression(object):
+    """Compresses text responses with brotli (when installed) or gzip, as the client prefers.
+
+    Only views and blueprints opted in with include() are compressed. A compressed page
+    that reflects request input next to a secret such as the CSRF token leaks the secret
+    through its compressed size (BREACH), so forms, search results and error pages are
+    sent as they are. Buffered bodies under COMPRESS_MIN_SIZE bytes are sent as they
+    are too. Streamed bodies are compressed chunk by chunk and flushed each time, so
+    streaming still lowers the time to first byte. Files sent with send_file() pass
+    through untouched.
+    """
+    def __init__(self, app=None):
+        self._views = set()
+        self._blueprints = set()
+        self.min_size = 500
+        self.gzip_level = 6
+        self.brotli_quality = 4
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('COMPRESS_ENABLED', True)
+        app.config.setdefault('COMPRESS_MIN_SIZE', 500)
+        app.config.setdefault('COMPRESS_GZIP_LEVEL', 6)
+        app.config.setdefault('COMPRESS_BROTLI_QUALITY', 4)
+
+        self.min_size = app.config['COMPRESS_MIN_SIZE']
+        self.gzip_level = app.config['COMPRESS_GZIP_LEVEL']
+        self.brotli_quality = app.config['COMPRESS_BROTLI_QUALITY']
+        app.extensions['compression'] = self
+        if app.config['COMPRESS_ENABLED']:
+            app.after_request(self._compress)
+
+    def include(self, view):
+        """Opt a view or a whole blueprint into compression; usable as a view decorator.
+
+        Only include responses that never echo request input.
+        """
+        if isinstance(view, Blueprint):
+            self._blueprints.add(view.name)
+        else:
+            self._views.add(f'{view.__module__}.{view.__name__}')
+        return view
+
+    def _included(self):
+        if request.blueprint in self._blueprints:
+            return True
+        view = current_app.view_functions.get(request.endpoint)
+        return view is not None and f'{view.__module__}.{view.__name__}' in self._views
+
+    @property
+    def encodings(self):
+        return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+    def _stream(self, encoding):
+        if encoding == 'br':
+            return BrotliStream(self.brotli_quality)
+        return GzipStream(self.gzip_level)
+
+    def _compress(self, response):
+        if (response.mimetype not in COMPRESSIBLE_MIMETYPES or response.direct_passthrough
+                or response.status_code < 200 or response.status_code in (204, 304)
+                or 'Content-Encoding' in response.headers or not self._included()):
+            return response
+
+        # The representation depends on Accept-Encoding whether or not this one is compressed
+        response.vary.add('Accept-Encoding')
+        encoding = request.accept_encodings.best_match(self.encodings)
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            response.response = compress_chunks(response.response, self._stream(encoding), encoding)
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < self.min_size:
+                return response
+            stream = self._stream(encoding)
+            compressed = stream.compress(data) + stream.finish()
+            bytes_in.inc(len(data), encoding=encoding)
+            bytes_out.inc(len(compressed), encoding=encoding)
+            response.set_data(compressed)
+
+        response.headers['Content-Encoding'] = encoding
+        # A strong validator must change with the encoding; a weak one may be shared
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
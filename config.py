@@ -0,0 +1,151 @@
+"""
+Application configuration, overridable through environment variables
+"""
+import os
+
+
+def env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+def env_float(name, default):
+    return float(os.environ.get(name, default))
+
+
+def engine_options(uri):
+    """Connection pool settings for the database URI"""
+    if uri.startswith('sqlite') and (':memory:' in uri or uri.rstrip('/') == 'sqlite:'):
+        # In-memory databases use a single shared connection
+        return {}
+    return {
+        'pool_size': env_int('DB_POOL_SIZE', 5),
+        'max_overflow': env_int('DB_MAX_OVERFLOW', 10),
+        'pool_timeout': env_float('DB_POOL_TIMEOUT', 30),
+        'pool_recycle': env_int('DB_POOL_RECYCLE', 3600),
+        'pool_pre_ping': not uri.startswith('sqlite'),
+    }
+
+
+class Config(object):
+    """Default settings"""
+    SECRET_KEY = os.environ.get('SECRET_KEY', 'your-secret-key-here')
+
+    # Database - point DATABASE_URL at a server database to leave SQLite
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'sqlite:///app.db')
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # Applied to every new SQLite connection. WAL lets readers run alongside a writer,
+    # synchronous=NORMAL is durable across application crashes in WAL mode, and
+    # busy_timeout makes writers wait for the lock instead of failing immediately.
+    SQLITE_PRAGMAS = {
+        'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE', 'WAL'),
+        'synchronous': os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+        'busy_timeout': env_int('SQLITE_BUSY_TIMEOUT_MS', 5000),
+        'cache_size': env_int('SQLITE_CACHE_SIZE_KB', 64000) * -1,
+        'mmap_size': env_int('SQLITE_MMAP_SIZE', 256 * 1024 * 1024),
+        'temp_store': 'MEMORY',
+    }
+
+    # CSRF Protection
+    WTF_CSRF_ENABLED = True
+    WTF_CSRF_TIME_LIMIT = None
+
+    # Secure Session Management
+    SESSION_COOKIE_HTTPONLY = True
+    SESSION_COOKIE_SAMESITE = 'Lax'
+    PERMANENT_SESSION_LIFETIME = 1800
+
+    # Server-side sessions: 'sqlite', 'file' or 'cookie' for Flask's signed cookies.
+    # SESSION_SQLITE_PATH and SESSION_FILE_DIR default to the instance folder.
+    SESSION_BACKEND = os.environ.get('SESSION_BACKEND', 'sqlite')
+    SESSION_CACHE_SIZE = env_int('SESSION_CACHE_SIZE', 10000)
+    SESSION_CACHE_TTL = env_float('SESSION_CACHE_TTL', 5.0)
+    SESSION_SWEEP_INTERVAL = env_int('SESSION_SWEEP_INTERVAL', 300)
+
+    # Password hashing pool
+    BCRYPT_LOG_ROUNDS = env_int('BCRYPT_LOG_ROUNDS', 12)
+    PASSWORD_POOL_WORKERS = env_int('PASSWORD_POOL_WORKERS', os.cpu_count() or 1)
+    PASSWORD_POOL_MAX_PENDING = env_int('PASSWORD_POOL_MAX_PENDING', 16)
+    PASSWORD_POOL_TIMEOUT = env_float('PASSWORD_POOL_TIMEOUT', 5.0)
+
+    # Login and registration throttling, checked before any form or bcrypt work.
+    # Each rule allows a burst of capacity requests refilled over period seconds;
+    # emptying it locks the client out for lockout seconds, doubling on repeats.
+    RATELIMIT_ENABLED = os.environ.get('RATELIMIT_ENABLED', '1') not in ('0', 'false', 'no')
+    RATELIMIT_RULES = {
+        'login': {
+            'ip': {'capacity': 20, 'period': 60},
+            'username': {'capacity': 5, 'period': 60, 'lockout': 60},
+        },
+        'register': {
+            'ip': {'capacity': 10, 'period': 3600},
+        },
+        'username_check': {
+            'ip': {'capacity': 60, 'period': 60},
+        },
+    }
+
+    # Registered usernames kept in a per-worker Bloom filter, so availability checks
+    # rarely query the database; rebuilt in the background every USERNAME_FILTER_REFRESH seconds
+    USERNAME_FILTER_CAPACITY = env_int('USERNAME_FILTER_CAPACITY', 1000000)
+    USERNAME_FILTER_ERROR_RATE = 0.01
+    USERNAME_FILTER_REFRESH = env_int('USERNAME_FILTER_REFRESH', 300)
+
+    # Threads that run Flask requests under asgi:app; more than the database pool
+    # allows (DB_POOL_SIZE + DB_MAX_OVERFLOW) would only wait for a connection
+    ASGI_THREADS = env_int('ASGI_THREADS', 15)
+
+    # Requests slower than this are logged with a time breakdown
+    SLOW_REQUEST_MS = env_int('SLOW_REQUEST_MS', 500)
+
+    # Page ETags change with this revision; deploys may set it to e.g. a commit hash.
+    # Static URLs carry a content hash, so browsers may keep the files for a year.
+    APP_REVISION = os.environ.get('APP_REVISION')
+    SEND_FILE_MAX_AGE_DEFAULT = 365 * 24 * 3600
+
+    # Compiled templates are kept on disk between restarts (empty to disable; defaults
+    # to instance/jinja_cache) and every template is compiled when the app is created
+    TEMPLATE_BYTECODE_CACHE_DIR = os.environ.get('TEMPLATE_BYTECODE_CACHE_DIR')
+    TEMPLATE_WARMUP = os.environ.get('TEMPLATE_WARMUP', '1') not in ('0', 'false', 'no')
+
+    # Dashboard pagination
+    CONTACTS_PER_PAGE = 50
+
+    # Streamed pages are sent in pieces of about this many characters
+    STREAM_CHUNK_SIZE = 16 * 1024
+
+    # Text responses are compressed with brotli or gzip, as Accept-Encoding prefers,
+    # when larger than COMPRESS_MIN_SIZE bytes; brotli needs requirements-compression.txt
+    COMPRESS_ENABLED = os.environ.get('COMPRESS_ENABLED', '1') not in ('0', 'false', 'no')
+    COMPRESS_MIN_SIZE = env_int('COMPRESS_MIN_SIZE', 500)
+    COMPRESS_GZIP_LEVEL = env_int('COMPRESS_GZIP_LEVEL', 6)
+    COMPRESS_BROTLI_QUALITY = env_int('COMPRESS_BROTLI_QUALITY', 4)
+
+    # Rendered dashboard contact tables kept per worker, least recently used evicted first
+    FRAGMENT_CACHE_BYTES = env_int('FRAGMENT_CACHE_BYTES', 16 * 1024 * 1024)
+
+    # Deleted contacts are tombstoned, then removed by a background thread in each
+    # worker every CONTACT_PURGE_INTERVAL seconds (0 turns it off) once they are
+    # CONTACT_PURGE_GRACE seconds old, CONTACT_PURGE_BATCH_SIZE rows per transaction
+    CONTACT_PURGE_INTERVAL = env_int('CONTACT_PURGE_INTERVAL', 60)
+    CONTACT_PURGE_GRACE = env_int('CONTACT_PURGE_GRACE', 0)
+    CONTACT_PURGE_BATCH_SIZE = env_int('CONTACT_PURGE_BATCH_SIZE', 500)
+    CONTACT_PURGE_PAUSE = env_float('CONTACT_PURGE_PAUSE', 0.05)
+
+    # Group commit: contact() and delete_contact() hand their write to one thread per
+    # worker, which commits everything queued within GROUP_COMMIT_WINDOW_MS (at most
+    # GROUP_COMMIT_MAX_OPS) in one transaction. Off by default.
+    GROUP_COMMIT_ENABLED = os.environ.get('GROUP_COMMIT_ENABLED', '0') not in ('0', 'false', 'no')
+    GROUP_COMMIT_WINDOW_MS = env_float('GROUP_COMMIT_WINDOW_MS', 2.0)
+    GROUP_COMMIT_MAX_OPS = env_int('GROUP_COMMIT_MAX_OPS', 64)
+    GROUP_COMMIT_TIMEOUT = env_float('GROUP_COMMIT_TIMEOUT', 5.0)
+
+    # JSON API
+    API_PAGE_SIZE = 100
+    API_MAX_PAGE_SIZE = 1000
+    API_MAX_BATCH = 1000
+
+    # Bulk import and export
+    MAX_CONTENT_LENGTH = 32 * 1024 * 1024
+    CONTACT_IMPORT_BATCH_SIZE = 500
+    CONTACT_EXPORT_BATCH_SIZE = 1000
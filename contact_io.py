@@ -0,0 +1,109 @@
+"""
+Streaming bulk import and export of contacts as CSV or JSON Lines
+"""
+import csv
+import io
+import json
+
+from forms import CONTACT_FIELDS, validate_contact_data
+from models import db, insert_contacts, iter_contacts
+
+FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+
+
+class ImportResult(object):
+    """Outcome of an import, with the first few row errors kept for display"""
+    def __init__(self, max_errors=100):
+        self.imported = 0
+        self.failed = 0
+        self.errors = []
+        self.max_errors = max_errors
+
+    def add_error(self, line, message):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append((line, message))
+
+
+def _format_errors(errors):
+    return '; '.join(f"{field}: {messages[0]}" for field, messages in errors.items())
+
+
+def iter_rows(stream, fmt):
+    """Yield (line number, row dict or error message) from an uploaded binary stream"""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        missing = [name for name in CONTACT_FIELDS if name not in (reader.fieldnames or ())]
+        if missing:
+            yield 1, f"Missing column(s): {', '.join(missing)}"
+            return
+        for row in reader:
+            yield reader.line_num, row
+    else:
+        for line_number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                yield line_number, 'Invalid JSON'
+                continue
+            yield line_number, row if isinstance(row, dict) else 'Each line must be a JSON object'
+
+
+def import_contacts(user_id, stream, fmt, batch_size=500, max_errors=100):
+    """Validate each row with the ContactForm rules and insert valid rows in batched transactions"""
+    result = ImportResult(max_errors)
+    batch = []
+
+    def flush():
+        insert_contacts(user_id, batch)
+        db.session.commit()
+        result.imported += len(batch)
+        batch.clear()
+
+    try:
+        for line, row in iter_rows(stream, fmt):
+            if isinstance(row, str):
+                result.add_error(line, row)
+                continue
+            values, errors = validate_contact_data(row)
+            if errors:
+                result.add_error(line, _format_errors(errors))
+                continue
+            batch.append(values)
+            if len(batch) >= batch_size:
+                flush()
+    except UnicodeDecodeError:
+        result.add_error(None, 'File is not valid UTF-8; stopped reading')
+    except csv.Error as error:
+        result.add_error(None, f'Malformed CSV ({error}); stopped reading')
+
+    if batch:
+        flush()
+    return result
+
+
+def export_contacts(user_id, fmt, batch_size=1000):
+    """Generate a user's contacts as CSV or JSONL text chunks without loading them all"""
+    buffer = io.StringIO()
+    if fmt == 'csv':
+        writer = csv.writer(buffer)
+        writer.writerow(CONTACT_FIELDS)
+
+    for count, row in enumerate(iter_contacts(user_id, batch_size=batch_size), start=1):
+        if fmt == 'csv':
+            writer.writerow(row)
+        else:
+            buffer.write(json.dumps(dict(zip(CONTACT_FIELDS, row))) + '\n')
+        if count % batch_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue()
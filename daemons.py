@@ -0,0 +1,36 @@
+"""
+Per-worker daemon threads, started lazily so each worker process runs its own
+"""
+import threading
+
+
+class DaemonThread(object):
+    """A named daemon thread that start() runs at most once at a time.
+
+    Threads don't survive a fork, so owners call start() from the first request or
+    operation that needs the thread rather than at import; a thread that has died
+    is started again by the next call.
+    """
+    def __init__(self, name):
+        self.name = name
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def is_alive(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, target, *args):
+        """Run target(*args) on the thread unless it is already running; True if this call started it"""
+        if self.is_alive():
+            return False
+        with self._lock:
+            if self.is_alive():
+                return False
+            self._thread = threading.Thread(target=target, args=args, name=self.name, daemon=True)
+            self._thread.start()
+        return True
+
+    def join(self, timeout=None):
+        """Wait for the thread, if one was started, to finish"""
+        if self._thread is not None:
+            self._thread.join(timeout)
@@ -0,0 +1,49 @@
+"""
+Cache of rendered template fragments, invalidated by bumping a version in the key
+"""
+from flask import render_template
+from flask_wtf.csrf import generate_csrf
+from markupsafe import Markup
+
+from cache import LRUCache
+from metrics import registry
+
+# Stands in for the per-session CSRF token inside cached HTML. Autoescaped values can
+# never contain a literal "<", so user data cannot smuggle the placeholder in.
+CSRF_PLACEHOLDER = Markup('<csrf-token>')
+
+fragment_lookups = registry.counter('fragment_cache_lookups_total', 'Fragment cache lookups',
+                                    ['fragment', 'result'])
+
+
+class FragmentCache(object):
+    """Renders a template once per key and serves the HTML from a byte-capped LRU cache.
+
+    Keys must include whatever changes the output, typically the owner's id and a
+    version counter bumped on every write. Templates use csrf_placeholder where they
+    would call csrf_token(); the current request's token is filled in on every hit.
+    """
+    def __init__(self, app=None):
+        self.cache = LRUCache(max_bytes=0)
+        registry.gauge('fragment_cache_bytes', 'Bytes of HTML held in the fragment cache',
+                       function=lambda: self.cache.bytes)
+        registry.gauge('fragment_cache_evictions', 'Fragments evicted to stay under the size cap',
+                       function=lambda: self.cache.evictions)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('FRAGMENT_CACHE_BYTES', 16 * 1024 * 1024)
+        # Sized by UTF-8 length: len() of a str counts characters, up to 4x fewer than its bytes
+        self.cache = LRUCache(max_bytes=app.config['FRAGMENT_CACHE_BYTES'],
+                              sizeof=lambda html: len(html.encode('utf-8')))
+        app.extensions['fragment_cache'] = self
+
+    def render(self, name, key, template, context):
+        """Return the fragment for key, calling context() and rendering only on a miss"""
+        html = self.cache.get((name,) + key)
+        fragment_lookups.inc(fragment=name, result='hit' if html is not None else 'miss')
+        if html is None:
+            html = render_template(template, csrf_placeholder=CSRF_PLACEHOLDER, **context())
+            self.cache.set((name,) + key, html)
+        return Markup(html.replace(CSRF_PLACEHOLDER, generate_csrf()))
@@ -0,0 +1,134 @@
+"""
+Group commit: contact writes from concurrent requests committed together in one transaction
+"""
+import queue
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+from flask import current_app
+
+from daemons import DaemonThread
+from metrics import registry
+from models import db
+
+batch_ops = registry.histogram(
+    'group_commit_batch_ops', 'Operations committed per group-commit transaction',
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256))
+ops_total = registry.counter('group_commit_ops_total', 'Operations handled by the group-commit writer', ['result'])
+timeouts_total = registry.counter('group_commit_timeouts_total', 'Requests that gave up waiting for a group commit')
+
+
+class WriteQueueBusy(Exception):
+    """Raised when a write is not committed within GROUP_COMMIT_TIMEOUT"""
+
+
+class GroupCommitWriter(object):
+    """Funnels contact writes through one thread that commits them in batches.
+
+    With GROUP_COMMIT_ENABLED, run() queues the operation and blocks until it is
+    committed. The writer thread takes whatever arrived within GROUP_COMMIT_WINDOW_MS
+    of the first operation, up to GROUP_COMMIT_MAX_OPS, runs each in its own SAVEPOINT
+    so one failure rolls back only that operation, and commits the rest together:
+    one fsync and one acquisition of the write lock for the whole batch. Disabled,
+    run() executes the operation in the request's session and commits it at once.
+    """
+    def __init__(self, app=None):
+        self._queue = queue.Queue()
+        self._writer = DaemonThread('group-commit')
+        self.enabled = False
+        self.window = 0.002
+        self.max_ops = 64
+        self.timeout = 5.0
+        registry.gauge('group_commit_pending', 'Operations waiting for the group-commit writer',
+                       function=lambda: self._queue.qsize())
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('GROUP_COMMIT_ENABLED', False)
+        app.config.setdefault('GROUP_COMMIT_WINDOW_MS', 2)
+        app.config.setdefault('GROUP_COMMIT_MAX_OPS', 64)
+        app.config.setdefault('GROUP_COMMIT_TIMEOUT', 5.0)
+
+        self.enabled = app.config['GROUP_COMMIT_ENABLED']
+        self.window = app.config['GROUP_COMMIT_WINDOW_MS'] / 1000
+        self.max_ops = app.config['GROUP_COMMIT_MAX_OPS']
+        self.timeout = app.config['GROUP_COMMIT_TIMEOUT']
+        app.extensions['group_commit'] = self
+
+    def run(self, operation, *args):
+        """Run operation(*args) against db.session and commit it, returning its result.
+
+        Operations must only write through db.session and must not commit.
+        """
+        if not self.enabled:
+            result = operation(*args)
+            db.session.commit()
+            return result
+
+        # One writer per worker process, started by its first queued write; batches
+        # only ever group writes from the same worker
+        self._writer.start(self._write_forever, current_app._get_current_object())
+        future = Future()
+        self._queue.put((future, operation, args))
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            # Still committed if the writer gets to it; the caller just stops waiting
+            timeouts_total.inc()
+            raise WriteQueueBusy(f'Write not committed within {self.timeout}s')
+
+    def _collect(self):
+        """Block for the first operation, then take more until the window closes or the batch is full"""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_ops:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write_forever(self, app):
+        while True:
+            batch = self._collect()
+            with app.app_context():
+                self._commit(batch)
+
+    def _commit(self, batch):
+        results = []
+        try:
+            if db.engine.dialect.name == 'sqlite':
+                # pysqlite defers BEGIN until the first INSERT/UPDATE, so without this the
+                # first SAVEPOINT would open the transaction and its RELEASE would commit it
+                db.session.connection().exec_driver_sql('BEGIN IMMEDIATE')
+            for future, operation, args in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    with db.session.begin_nested():
+                        results.append((future, operation(*args), None))
+                except Exception as error:
+                    results.append((future, None, error))
+            db.session.commit()
+        except Exception as error:
+            db.session.rollback()
+            current_app.logger.exception('Group commit of %d operation(s) failed', len(batch))
+            for future, _operation, _args in batch:
+                if not future.done():
+                    ops_total.inc(result='error')
+                    future.set_exception(error)
+            return
+        finally:
+            db.session.remove()
+
+        batch_ops.observe(len(results))
+        for future, result, error in results:
+            ops_total.inc(result='error' if error else 'committed')
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
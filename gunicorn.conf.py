@@ -0,0 +1,81 @@
+"""
+Gunicorn settings for production: gunicorn -c gunicorn.conf.py wsgi:app
+
+The app is imported once in the master and forked into the workers, so code and
+templates are shared copy-on-write. Workers are recycled after a bounded number of
+requests and report their request count and resident memory as they go.
+"""
+import itertools
+import os
+
+from config import env_int
+
+bind = os.environ.get('BIND', '0.0.0.0:8000')
+workers = env_int('WEB_CONCURRENCY', os.cpu_count() or 1)
+threads = env_int('GUNICORN_THREADS', 4)
+worker_class = 'gthread' if threads > 1 else 'sync'
+
+# Import once before forking
+preload_app = True
+
+# Recycle workers to bound slow memory growth; jitter keeps them from restarting together
+max_requests = env_int('GUNICORN_MAX_REQUESTS', 1000)
+max_requests_jitter = env_int('GUNICORN_MAX_REQUESTS_JITTER', 100)
+
+timeout = env_int('GUNICORN_TIMEOUT', 30)
+graceful_timeout = env_int('GUNICORN_GRACEFUL_TIMEOUT', 30)
+keepalive = 5
+pidfile = os.environ.get('GUNICORN_PIDFILE', 'gunicorn.pid')
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG') or None
+
+# Log each worker's totals every this many requests
+report_every = env_int('GUNICORN_REPORT_EVERY', 500)
+
+# Every worker gets its own bcrypt pool; unless PASSWORD_POOL_WORKERS is set, split the
+# cores between them instead of giving each worker a pool as large as the machine.
+# Applied in post_fork: the preloaded app has already read its config by now.
+password_pool_workers = env_int('PASSWORD_POOL_WORKERS', max(1, (os.cpu_count() or 1) // workers))
+
+
+def rss_bytes():
+    """Current resident set size of this process"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def report(worker, event, served):
+    worker.log.info('worker %s %s: %d request(s), RSS %.1f MiB',
+                    worker.pid, event, served, rss_bytes() / (1024 * 1024))
+
+
+def post_fork(server, worker):
+    # Connections opened in the master must never be shared with a child
+    from models import db
+    app = server.app.wsgi()
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+    app.config['PASSWORD_POOL_WORKERS'] = password_pool_workers
+    app.extensions['password_hasher'].workers = password_pool_workers
+    # next() on a count is atomic, so gthread workers need no lock
+    worker.served = itertools.count(1)
+    worker.served_total = 0
+
+
+def post_request(worker, req, environ, resp):
+    served = worker.served_total = next(worker.served)
+    if served % report_every == 0:
+        report(worker, 'serving', served)
+
+
+def worker_exit(server, worker):
+    report(worker, 'exiting', getattr(worker, 'served_total', 0))
+
+
+def when_ready(server):
+    server.log.info('Serving %d %s worker(s), recycled after ~%d requests',
+                    server.num_workers, worker_class, max_requests)
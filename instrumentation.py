@@ -0,0 +1,127 @@
+"""
+Per-request timing of routes, SQL statements and template rendering
+"""
+import time
+
+from flask import before_render_template, current_app, g, has_request_context, request, template_rendered
+from sqlalchemy import event
+
+from metrics import registry
+
+SQL_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+requests_total = registry.counter(
+    'http_requests_total', 'Requests handled', ['endpoint', 'method', 'status'])
+request_seconds = registry.histogram(
+    'http_request_duration_seconds', 'Time from request start to response', ['endpoint', 'method'])
+sql_statements = registry.histogram(
+    'http_request_sql_statements', 'SQL statements executed per request', ['endpoint'], buckets=SQL_COUNT_BUCKETS)
+sql_seconds = registry.histogram(
+    'http_request_sql_seconds', 'Time spent executing SQL per request', ['endpoint'])
+render_seconds = registry.histogram(
+    'http_request_render_seconds', 'Time spent rendering templates per request', ['endpoint'])
+password_seconds = registry.histogram(
+    'http_request_password_seconds', 'Time spent waiting on password hashing per request', ['endpoint'])
+
+
+class RequestTimings(object):
+    """Breakdown of where one request spent its time"""
+    __slots__ = ('start', 'sql_count', 'sql', 'render', 'password', 'render_starts')
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.sql_count = 0
+        self.sql = 0.0
+        self.render = 0.0
+        self.password = 0.0
+        self.render_starts = []
+
+
+def current_timings():
+    """Timings for the active request, or None outside a request"""
+    if has_request_context():
+        return g.get('_timings')
+    return None
+
+
+def record_password_wait(seconds):
+    """Attribute time spent waiting on the password pool to the current request"""
+    timings = current_timings()
+    if timings is not None:
+        timings.password += seconds
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('_query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['_query_start'].pop()
+    timings = current_timings()
+    if timings is not None:
+        timings.sql_count += 1
+        timings.sql += time.perf_counter() - started
+
+
+def _before_render(sender, template, context, **extra):
+    timings = current_timings()
+    if timings is not None:
+        timings.render_starts.append(time.perf_counter())
+
+
+def _after_render(sender, template, context, **extra):
+    timings = current_timings()
+    if timings is not None and timings.render_starts:
+        started = timings.render_starts.pop()
+        # Only the outermost render counts, so nested renders are not added twice
+        if not timings.render_starts:
+            timings.render += time.perf_counter() - started
+
+
+class Instrumentation(object):
+    """Records latency, SQL and render time for every request and logs slow ones"""
+    def __init__(self, app=None, db=None):
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        app.config.setdefault('SLOW_REQUEST_MS', 500)
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        before_render_template.connect(_before_render, app)
+        template_rendered.connect(_after_render, app)
+
+        with app.app_context():
+            engines = list(db.engines.values())
+        for engine in engines:
+            event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+        app.extensions['instrumentation'] = self
+
+    def _start_request(self):
+        g._timings = RequestTimings()
+
+    def _finish_request(self, response):
+        timings = g.pop('_timings', None)
+        if timings is None:
+            return response
+
+        elapsed = time.perf_counter() - timings.start
+        endpoint = request.endpoint or 'unknown'
+        requests_total.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+        request_seconds.observe(elapsed, endpoint=endpoint, method=request.method)
+        sql_statements.observe(timings.sql_count, endpoint=endpoint)
+        sql_seconds.observe(timings.sql, endpoint=endpoint)
+        render_seconds.observe(timings.render, endpoint=endpoint)
+        if timings.password:
+            password_seconds.observe(timings.password, endpoint=endpoint)
+
+        if elapsed * 1000 >= current_app.config['SLOW_REQUEST_MS']:
+            other = elapsed - timings.sql - timings.render - timings.password
+            current_app.logger.warning(
+                'Slow request %s %s -> %s in %.1fms: sql=%.1fms (%d statements), render=%.1fms, '
+                'password=%.1fms, other=%.1fms',
+                request.method, request.path, response.status_code, elapsed * 1000,
+                timings.sql * 1000, timings.sql_count, timings.render * 1000,
+                timings.password * 1000, other * 1000)
+        return response
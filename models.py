@@ -1,25 +1,439 @@
-"""
-Simple database models
-"""
-from flask_sqlalchemy import SQLAlchemy
-
-db = SQLAlchemy()
-
-
-class User(db.Model):
-    """User model"""
-    id = db.Column(db.Integer, primary_key=True)
-    username = db.Column(db.String(100), unique=True, nullable=False)
-    password = db.Column(db.String(200), nullable=False)
-    contacts = db.relationship('Contact', backref='user', lazy=True, cascade='all, delete-orphan')
-
-
-class Contact(db.Model):
-    """Contact model"""
-    id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(100), nullable=False)
-    email = db.Column(db.String(100), nullable=False)
-    phone = db.Column(db.String(20), nullable=False)
-    address = db.Column(db.String(200), nullable=False)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-
+"""
+Simple database models
+"""
+import hashlib
+import re
+import secrets
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache, partial
+
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import DDL, event
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.schema import CreateColumn
+
+db = SQLAlchemy()
+
+
+def apply_sqlite_pragmas(pragmas, dbapi_connection, connection_record):
+    """Connection event hook that runs PRAGMA statements on a new DBAPI connection"""
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+    finally:
+        cursor.close()
+
+
+def init_db(app):
+    """Bind the database to the app and apply SQLITE_PRAGMAS to every new SQLite connection"""
+    db.init_app(app)
+    pragmas = app.config.get('SQLITE_PRAGMAS') or {}
+    for name in pragmas:
+        if not name.isidentifier():
+            raise ValueError(f'Invalid SQLite pragma name: {name!r}')
+
+    with app.app_context():
+        engines = list(db.engines.values())
+    for engine in engines:
+        if engine.dialect.name == 'sqlite' and pragmas:
+            event.listen(engine, 'connect', partial(apply_sqlite_pragmas, dict(pragmas)))
+
+
+class User(db.Model):
+    """User model"""
+    # Never hand a deleted account's id to a new one; tombstoned contacts still carry it
+    __table_args__ = {'sqlite_autoincrement': True}
+
+    id = db.Column(db.Integer, primary_key=True)
+    username = db.Column(db.String(100), unique=True, nullable=False)
+    password = db.Column(db.String(200), nullable=False)
+    # Bumped in the same transaction as every write to the user's contacts
+    contact_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Delete accounts with delete_user(); the ORM never loads contacts to cascade a delete
+    contacts = db.relationship('Contact', backref='user', lazy=True, cascade='all, delete-orphan',
+                               passive_deletes=True)
+    api_tokens = db.relationship('ApiToken', lazy=True, cascade='all, delete-orphan', passive_deletes=True)
+
+
+# Rows of a partial index; queries must repeat the condition for SQLite to use it
+LIVE_CONTACTS = db.text('deleted_at IS NULL')
+TOMBSTONED_CONTACTS = db.text('deleted_at IS NOT NULL')
+
+
+class Contact(db.Model):
+    """Contact model; deleted contacts keep their row with deleted_at set until purged"""
+    __table_args__ = (
+        # Dashboard keyset pagination, covering live contacts only
+        db.Index('ix_contact_live_user_id_id', 'user_id', 'id',
+                 sqlite_where=LIVE_CONTACTS, postgresql_where=LIVE_CONTACTS),
+        # Per-user lookups and ordering by name
+        db.Index('ix_contact_live_user_id_name', 'user_id', 'name',
+                 sqlite_where=LIVE_CONTACTS, postgresql_where=LIVE_CONTACTS),
+        # Oldest tombstones first for the purger
+        db.Index('ix_contact_deleted_at', 'deleted_at',
+                 sqlite_where=TOMBSTONED_CONTACTS, postgresql_where=TOMBSTONED_CONTACTS),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    email = db.Column(db.String(100), nullable=False)
+    phone = db.Column(db.String(20), nullable=False)
+    address = db.Column(db.String(200), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
+    deleted_at = db.Column(db.DateTime, nullable=True)
+
+
+class ApiToken(db.Model):
+    """API bearer token; only a SHA-256 digest of the token is stored"""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False, index=True)
+    name = db.Column(db.String(100), nullable=False)
+    token_hash = db.Column(db.String(64), unique=True, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, server_default=db.func.current_timestamp())
+
+
+def create_user(username, password_hash):
+    """Insert and commit a user, returning its id, or None if the username is taken.
+
+    The unique constraint decides, so two concurrent registrations of one name
+    cannot both succeed and neither needs a lookup first.
+    """
+    try:
+        user_id = db.session.execute(
+            db.insert(User).values(username=username, password=password_hash).returning(User.id)).scalar_one()
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return None
+    return user_id
+
+
+def hash_api_token(token):
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+def create_api_token(user_id, name):
+    """Issue a new token for a user, returning the plain token; it cannot be recovered later"""
+    token = secrets.token_urlsafe(32)
+    db.session.add(ApiToken(user_id=user_id, name=name, token_hash=hash_api_token(token)))
+    db.session.commit()
+    return token
+
+
+def api_token_user(token):
+    """Id of the user a bearer token belongs to, or None"""
+    return db.session.query(ApiToken.user_id).filter(ApiToken.token_hash == hash_api_token(token)).scalar()
+
+
+# Full-text search over contacts. contact_fts is an external-content FTS5 table that
+# stores only the index; triggers keep it in step with every write to contact.
+# user_id is indexed too, so a search is narrowed to one owner inside FTS itself.
+CONTACT_SEARCH_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS contact_fts USING fts5("
+    "name, email, phone, address, user_id, "
+    "content='contact', content_rowid='id', tokenize='unicode61', prefix='2 3')",
+
+    "CREATE TRIGGER IF NOT EXISTS contact_fts_insert AFTER INSERT ON contact BEGIN "
+    "INSERT INTO contact_fts(rowid, name, email, phone, address, user_id) "
+    "VALUES (new.id, new.name, new.email, new.phone, new.address, new.user_id); END",
+
+    "CREATE TRIGGER IF NOT EXISTS contact_fts_delete AFTER DELETE ON contact BEGIN "
+    "INSERT INTO contact_fts(contact_fts, rowid, name, email, phone, address, user_id) "
+    "VALUES ('delete', old.id, old.name, old.email, old.phone, old.address, old.user_id); END",
+
+    "CREATE TRIGGER IF NOT EXISTS contact_fts_update "
+    "AFTER UPDATE OF name, email, phone, address, user_id ON contact BEGIN "
+    "INSERT INTO contact_fts(contact_fts, rowid, name, email, phone, address, user_id) "
+    "VALUES ('delete', old.id, old.name, old.email, old.phone, old.address, old.user_id); "
+    "INSERT INTO contact_fts(rowid, name, email, phone, address, user_id) "
+    "VALUES (new.id, new.name, new.email, new.phone, new.address, new.user_id); END",
+)
+
+for _statement in CONTACT_SEARCH_DDL:
+    event.listen(Contact.__table__, 'after_create', DDL(_statement).execute_if(dialect='sqlite'))
+
+
+def rebuild_search_index():
+    """Repopulate contact_fts from the contact table; False where there is none (not SQLite)"""
+    if db.engine.dialect.name != 'sqlite':
+        return False
+    db.session.execute(db.text("INSERT INTO contact_fts(contact_fts) VALUES ('rebuild')"))
+    db.session.commit()
+    return True
+
+
+# Indexes superseded by a later schema, dropped by upgrade_schema()
+RETIRED_INDEXES = {
+    'contact': ('ix_contact_user_id_id', 'ix_contact_user_id_name'),
+}
+
+
+def upgrade_schema():
+    """Create missing tables, columns and indexes and drop retired ones, returning a line per change"""
+    existing_tables = set(db.inspect(db.engine).get_table_names())
+    db.create_all()
+    changes = [f'Created {table.name}' for table in db.metadata.sorted_tables if table.name not in existing_tables]
+    inspector = db.inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        columns = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in columns:
+                # New columns need a server default so existing rows satisfy NOT NULL
+                spec = CreateColumn(column).compile(dialect=db.engine.dialect)
+                with db.engine.begin() as conn:
+                    conn.exec_driver_sql(f'ALTER TABLE {table.name} ADD COLUMN {spec}')
+                changes.append(f'Created {table.name}.{column.name}')
+
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(bind=db.engine)
+                changes.append(f'Created {index.name}')
+        for name in RETIRED_INDEXES.get(table.name, ()):
+            if name in existing:
+                with db.engine.begin() as conn:
+                    conn.exec_driver_sql(f'DROP INDEX {name}')
+                changes.append(f'Dropped {name}')
+
+    if db.engine.dialect.name == 'sqlite' and not inspector.has_table('contact_fts'):
+        with db.engine.begin() as conn:
+            for statement in CONTACT_SEARCH_DDL:
+                conn.exec_driver_sql(statement)
+        rebuild_search_index()
+        changes.append('Created contact_fts')
+    return changes
+
+
+# Columns rendered by the dashboard; selecting only these skips ORM hydration
+CONTACT_LIST_COLUMNS = (Contact.id, Contact.name, Contact.email, Contact.phone, Contact.address)
+
+# Columns written by exports, in the order imports read them back
+CONTACT_EXPORT_COLUMNS = (Contact.name, Contact.email, Contact.phone, Contact.address)
+
+# Read-only contact for list views. A namedtuple has empty __slots__, so each row is
+# one tuple: no identity map entry, attribute instrumentation or per-instance __dict__
+ContactRow = namedtuple('ContactRow', [column.key for column in CONTACT_LIST_COLUMNS])
+
+
+@lru_cache(maxsize=64)
+def row_type(names):
+    """The namedtuple class for rows with these column names"""
+    return ContactRow if names == ContactRow._fields else namedtuple('ContactFields', names)
+
+
+def read_rows(statement, parameters=None, batch_size=None):
+    """Run a select on the session's connection and yield namedtuples straight off the cursor.
+
+    The ORM never sees the rows, so nothing is hydrated or tracked. With batch_size,
+    rows are fetched that many at a time instead of all at once.
+    """
+    if batch_size:
+        # On the statement: Connection.execution_options() would change the session's
+        # connection in place, leaving yield_per on for the rest of the transaction
+        statement = statement.execution_options(yield_per=batch_size)
+    result = db.session.connection().execute(statement, parameters)
+    make = row_type(tuple(result.keys()))._make
+    for rows in result.partitions():
+        yield from map(make, rows)
+
+
+class ContactPage(object):
+    """One keyset page of a user's contacts"""
+    def __init__(self, rows, has_prev, has_next):
+        self.rows = rows
+        self.has_prev = has_prev
+        self.has_next = has_next
+
+    @property
+    def first_id(self):
+        return self.rows[0].id if self.rows else None
+
+    @property
+    def last_id(self):
+        return self.rows[-1].id if self.rows else None
+
+
+# SQLite integers are signed 64-bit; the driver raises OverflowError for anything larger
+MAX_ID = 2 ** 63 - 1
+
+
+def valid_id(value):
+    """Whether an id or keyset cursor taken from a request fits in a database integer"""
+    return -MAX_ID - 1 <= value <= MAX_ID
+
+
+def live_contacts(user_id):
+    """Filter for a user's contacts that have not been deleted, served by the partial indexes"""
+    return db.and_(Contact.user_id == user_id, Contact.deleted_at.is_(None))
+
+
+def count_contacts(user_id):
+    """Total number of contacts owned by a user"""
+    return db.session.query(db.func.count(Contact.id)).filter(live_contacts(user_id)).scalar()
+
+
+def contact_page(user_id, after=None, before=None, per_page=50, columns=CONTACT_LIST_COLUMNS):
+    """Fetch a page of contacts ordered by id using an (user_id, id) keyset cursor.
+
+    columns must include Contact.id, which the cursor is built from. Pages carry no
+    row numbers: counting the rows before a page would cost as much as OFFSET.
+    """
+    query = db.select(*columns).where(live_contacts(user_id))
+
+    if before is not None:
+        query = query.where(Contact.id < before).order_by(Contact.id.desc())
+    else:
+        if after is not None:
+            query = query.where(Contact.id > after)
+        query = query.order_by(Contact.id)
+
+    # Fetch one extra row to learn whether another page exists
+    rows = list(read_rows(query.limit(per_page + 1)))
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+
+    if before is not None:
+        rows.reverse()
+        has_prev, has_next = more, True
+    else:
+        has_prev, has_next = after is not None, more
+
+    return ContactPage(rows, has_prev, has_next)
+
+
+def contact_version(user_id):
+    """Current version of a user's contact list, for keying cached renders"""
+    return db.session.query(User.contact_version).filter(User.id == user_id).scalar()
+
+
+def bump_contact_version(user_id):
+    """Invalidate cached renders of a user's contacts; call inside the writing transaction"""
+    db.session.execute(
+        db.update(User).where(User.id == user_id).values(contact_version=User.contact_version + 1))
+
+
+def insert_contacts(user_id, rows, returning=False):
+    """Insert many contacts for a user with a single executemany statement.
+
+    With returning=True the new ids are returned in the order of rows.
+    """
+    statement = db.insert(Contact)
+    if returning:
+        statement = statement.returning(Contact.id, sort_by_parameter_order=True)
+    result = db.session.execute(statement, [dict(row, user_id=user_id) for row in rows])
+    bump_contact_version(user_id)
+    return result.scalars().all() if returning else None
+
+
+def delete_contacts(user_id, ids):
+    """Tombstone the listed contacts a user owns in one statement, returning the ids removed.
+
+    The rows vanish from every query at once; purge_contacts() deletes them later.
+    """
+    result = db.session.execute(
+        db.update(Contact).where(live_contacts(user_id), Contact.id.in_(ids))
+        .values(deleted_at=db.func.current_timestamp()).returning(Contact.id))
+    deleted = result.scalars().all()
+    if deleted:
+        bump_contact_version(user_id)
+    return deleted
+
+
+def delete_user(user_id):
+    """Delete an account with one statement per table instead of loading every contact.
+
+    Contacts are tombstoned rather than deleted, leaving the bulk of the work to the
+    purger. Call inside a transaction and commit.
+    """
+    db.session.execute(
+        db.update(Contact).where(live_contacts(user_id)).values(deleted_at=db.func.current_timestamp()),
+        execution_options={'synchronize_session': False})
+    db.session.execute(db.delete(ApiToken).where(ApiToken.user_id == user_id),
+                       execution_options={'synchronize_session': False})
+    db.session.execute(db.delete(User).where(User.id == user_id),
+                       execution_options={'synchronize_session': False})
+
+
+def purge_contacts(grace=0, batch_size=500, pause=0.0):
+    """Delete contacts tombstoned more than grace seconds ago, batch_size rows per transaction.
+
+    Committing each batch keeps the write lock short however large the backlog is;
+    pause sleeps between batches so other writers get a turn. Returns the rows deleted.
+    """
+    cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=grace)
+    batch = (db.select(Contact.id)
+             .where(Contact.deleted_at.is_not(None), Contact.deleted_at <= cutoff)
+             .order_by(Contact.deleted_at).limit(batch_size))
+    purged = 0
+    while True:
+        result = db.session.execute(db.delete(Contact).where(Contact.id.in_(batch)),
+                                    execution_options={'synchronize_session': False})
+        db.session.commit()
+        purged += result.rowcount
+        if result.rowcount < batch_size:
+            return purged
+        if pause:
+            time.sleep(pause)
+
+
+def iter_contacts(user_id, columns=CONTACT_EXPORT_COLUMNS, batch_size=1000):
+    """Stream a user's contacts in id order, fetching batch_size rows at a time"""
+    return read_rows(db.select(*columns).where(live_contacts(user_id)).order_by(Contact.id),
+                     batch_size=batch_size)
+
+
+SEARCH_TERM = re.compile(r'\w+')
+SEARCH_MAX_TERMS = 8
+
+
+def search_match(user_id, text, max_terms=SEARCH_MAX_TERMS):
+    """Build an FTS5 query matching every word of text as a prefix, scoped to one user"""
+    terms = SEARCH_TERM.findall(text)[:max_terms]
+    if not terms:
+        return None
+    words = ' AND '.join(f'"{term}"*' for term in terms)
+    return f'user_id : "{int(user_id)}" AND {{name email phone address}} : ({words})'
+
+
+def search_contacts_like(user_id, text, page=1, per_page=50):
+    """Case-insensitive substring search for databases without contact_fts, in id order.
+
+    Every word must appear in one of the fields. The owner's partial index narrows the
+    scan to the user's own contacts, but each of those is still read.
+    """
+    terms = SEARCH_TERM.findall(text)[:SEARCH_MAX_TERMS]
+    if not terms:
+        return [], False
+
+    fields = (Contact.name, Contact.email, Contact.phone, Contact.address)
+    query = db.select(*CONTACT_LIST_COLUMNS).where(live_contacts(user_id), *(
+        db.or_(*(field.icontains(term, autoescape=True) for field in fields)) for term in terms
+    )).order_by(Contact.id).limit(per_page + 1).offset((page - 1) * per_page)
+    rows = list(read_rows(query))
+    return rows[:per_page], len(rows) > per_page
+
+
+def search_contacts(user_id, text, page=1, per_page=50):
+    """Ranked full-text search over a user's contacts, returning (rows, has_next)"""
+    if db.engine.dialect.name != 'sqlite':
+        # contact_fts is an FTS5 table, created only on SQLite
+        return search_contacts_like(user_id, text, page, per_page)
+    match = search_match(user_id, text)
+    if match is None:
+        return [], False
+
+    rows = list(read_rows(db.text(
+        "SELECT contact.id, contact.name, contact.email, contact.phone, contact.address "
+        "FROM contact_fts JOIN contact ON contact.id = contact_fts.rowid "
+        "WHERE contact_fts MATCH :match AND contact.user_id = :user_id AND contact.deleted_at IS NULL "
+        "ORDER BY contact_fts.rank LIMIT :limit OFFSET :offset"
+    ), {
+        'match': match,
+        'user_id': user_id,
+        'limit': per_page + 1,
+        'offset': (page - 1) * per_page,
+    }))
+    return rows[:per_page], len(rows) > per_page
@@ -0,0 +1,196 @@
+"""
+Password hashing on a bounded worker pool
+"""
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+import bcrypt
+
+from instrumentation import record_password_wait
+from metrics import registry
+
+# bcrypt only uses the first 72 bytes of a password
+BCRYPT_MAX_BYTES = 72
+
+# Pool processes must not be forked from a threaded worker: a lock held by another
+# thread at fork time stays locked forever in the child
+POOL_START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+hash_seconds = registry.histogram(
+    'password_hash_seconds', 'CPU time spent in bcrypt per operation', ['operation'])
+wait_seconds = registry.histogram(
+    'password_wait_seconds', 'Time a request waited for a bcrypt result, including queueing', ['operation'])
+rejected_total = registry.counter(
+    'password_pool_rejected_total', 'Password operations refused because the pool was full', ['operation'])
+timeouts_total = registry.counter(
+    'password_pool_timeouts_total', 'Password operations abandoned after the request timeout', ['operation'])
+broken_total = registry.counter(
+    'password_pool_broken_total', 'Pools discarded because a worker process died', ['operation'])
+rehashed_total = registry.counter(
+    'password_rehashed_total', 'Stored hashes upgraded or downgraded to the configured cost on login')
+
+
+class PasswordPoolBusy(Exception):
+    """Raised when password work cannot be admitted or does not finish in time"""
+
+
+def hash_cost(hashed):
+    """Return the bcrypt cost encoded in a hash such as $2b$12$..., or None if unparseable"""
+    parts = hashed.split('$') if hashed else []
+    if len(parts) < 4 or not parts[2].isdigit():
+        return None
+    return int(parts[2])
+
+
+def benchmark_costs(costs, seconds=1.0, password='benchmark-password'):
+    """Measure bcrypt hashes per second on this host for each cost"""
+    results = []
+    for cost in costs:
+        count = 0
+        start = time.perf_counter()
+        elapsed = 0.0
+        # Always hash at least once so slow costs still get a sample
+        while count == 0 or elapsed < seconds:
+            _hash_password(password, cost)
+            count += 1
+            elapsed = time.perf_counter() - start
+        results.append((cost, count / elapsed, elapsed / count))
+    return results
+
+
+def _encode(password):
+    return password.encode('utf-8')[:BCRYPT_MAX_BYTES]
+
+
+def _hash_password(password, rounds):
+    """Hash a password, returning (hash, seconds) - runs inside a pool worker"""
+    start = time.perf_counter()
+    hashed = bcrypt.hashpw(_encode(password), bcrypt.gensalt(rounds)).decode('utf-8')
+    return hashed, time.perf_counter() - start
+
+
+def _check_password(hashed, password):
+    """Verify a password, returning (matches, seconds) - runs inside a pool worker"""
+    start = time.perf_counter()
+    try:
+        matches = bcrypt.checkpw(_encode(password), hashed.encode('utf-8'))
+    except ValueError:
+        matches = False
+    return matches, time.perf_counter() - start
+
+
+class PasswordHasher(object):
+    """Runs bcrypt in a size-limited process pool so request threads stay free"""
+    def __init__(self, app=None):
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+        self.workers = 0
+        self.max_pending = 0
+        self.timeout = None
+        self.rounds = 12
+        registry.gauge('password_pool_pending', 'Password operations queued or running',
+                       function=lambda: self._pending)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('BCRYPT_LOG_ROUNDS', 12)
+        app.config.setdefault('PASSWORD_POOL_WORKERS', os.cpu_count() or 1)
+        app.config.setdefault('PASSWORD_POOL_MAX_PENDING', app.config['PASSWORD_POOL_WORKERS'] * 4)
+        app.config.setdefault('PASSWORD_POOL_TIMEOUT', 5.0)
+
+        self.rounds = app.config['BCRYPT_LOG_ROUNDS']
+        self.workers = app.config['PASSWORD_POOL_WORKERS']
+        self.max_pending = app.config['PASSWORD_POOL_MAX_PENDING']
+        self.timeout = app.config['PASSWORD_POOL_TIMEOUT']
+        app.extensions['password_hasher'] = self
+
+    @property
+    def pending(self):
+        return self._pending
+
+    def _get_executor(self):
+        # Created lazily so importing the app never forks
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers, mp_context=multiprocessing.get_context(POOL_START_METHOD))
+        return self._executor
+
+    def _discard_executor(self, executor, operation):
+        # A pool that lost a process (OOM kill, crash) refuses all further work, so drop
+        # it and let the next call start a fresh one
+        with self._executor_lock:
+            if self._executor is not executor:
+                return
+            self._executor = None
+        broken_total.inc(operation=operation)
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _admit(self, operation):
+        with self._pending_lock:
+            if self._pending >= self.max_pending:
+                rejected_total.inc(operation=operation)
+                raise PasswordPoolBusy(f'Password pool is full ({self._pending} pending)')
+            self._pending += 1
+
+    def _release(self, _future=None):
+        with self._pending_lock:
+            self._pending -= 1
+
+    def _run(self, operation, func, *args):
+        start = time.perf_counter()
+        if self.workers <= 0:
+            # Inline mode for development and tests
+            result, seconds = func(*args)
+        else:
+            self._admit(operation)
+            try:
+                executor = self._get_executor()
+                future = executor.submit(func, *args)
+            except BrokenProcessPool:
+                self._release()
+                self._discard_executor(executor, operation)
+                raise PasswordPoolBusy('Password pool is broken, restarting it')
+            except Exception:
+                self._release()
+                raise
+            future.add_done_callback(self._release)
+            try:
+                result, seconds = future.result(timeout=self.timeout)
+            except FutureTimeoutError:
+                future.cancel()
+                timeouts_total.inc(operation=operation)
+                raise PasswordPoolBusy(f'Password {operation} timed out after {self.timeout}s')
+            except BrokenProcessPool:
+                self._discard_executor(executor, operation)
+                raise PasswordPoolBusy(f'Password pool process died during {operation}, restarting it')
+        waited = time.perf_counter() - start
+        hash_seconds.observe(seconds, operation=operation)
+        wait_seconds.observe(waited, operation=operation)
+        record_password_wait(waited)
+        return result
+
+    def generate_password_hash(self, password, rounds=None):
+        """Hash a password with the configured bcrypt cost"""
+        return self._run('hash', _hash_password, password, rounds or self.rounds)
+
+    def check_password_hash(self, hashed, password):
+        """Check a password against a stored bcrypt hash"""
+        return self._run('check', _check_password, hashed, password)
+
+    def needs_rehash(self, hashed):
+        """True when a stored hash was made with a different cost than configured"""
+        return hash_cost(hashed) != self.rounds
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,59 @@
+"""
+Background purging of soft-deleted contacts
+"""
+import time
+
+from flask import current_app
+
+from daemons import DaemonThread
+from metrics import registry
+from models import purge_contacts
+
+contacts_purged = registry.counter('contacts_purged_total', 'Tombstoned contacts deleted by the purger')
+
+
+class ContactPurger(object):
+    """Deletes tombstoned contacts in bounded batches on a daemon thread in each worker.
+
+    Deleting a contact only sets deleted_at, so requests never wait on index and
+    search-index maintenance; this thread does that work later, one short
+    transaction per batch. CONTACT_PURGE_INTERVAL = 0 turns the thread off, for
+    deployments that run `flask purge-contacts` from cron instead.
+    """
+    def __init__(self, app=None):
+        self._thread = DaemonThread('contact-purger')
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('CONTACT_PURGE_INTERVAL', 60)
+        app.config.setdefault('CONTACT_PURGE_GRACE', 0)
+        app.config.setdefault('CONTACT_PURGE_BATCH_SIZE', 500)
+        app.config.setdefault('CONTACT_PURGE_PAUSE', 0.05)
+        app.extensions['contact_purger'] = self
+        if app.config['CONTACT_PURGE_INTERVAL'] > 0:
+            app.before_request(self._start)
+
+    def _start(self):
+        # Hooked to before_request, so the purger starts in each worker once it serves
+        # a request, never in the gunicorn master
+        self._thread.start(self._purge_forever, current_app._get_current_object())
+
+    def _purge_forever(self, app):
+        while True:
+            time.sleep(app.config['CONTACT_PURGE_INTERVAL'])
+            try:
+                with app.app_context():
+                    self.purge()
+            except Exception:
+                app.logger.exception('Contact purge failed')
+
+    def purge(self, grace=None, batch_size=None):
+        """Purge now with the app's settings, returning the number of contacts deleted"""
+        config = current_app.config
+        purged = purge_contacts(
+            grace=config['CONTACT_PURGE_GRACE'] if grace is None else grace,
+            batch_size=batch_size or config['CONTACT_PURGE_BATCH_SIZE'],
+            pause=config['CONTACT_PURGE_PAUSE'])
+        contacts_purged.inc(purged)
+        return purged
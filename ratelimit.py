@@ -0,0 +1,161 @@
+"""
+Token-bucket rate limiting with progressive lockout for expensive endpoints
+"""
+import math
+import threading
+import time
+from functools import wraps
+
+from flask import request
+
+from cache import LRUCache
+from metrics import registry
+
+rejected_total = registry.counter(
+    'ratelimit_rejected_total', 'Requests refused by the rate limiter', ['scope', 'key'])
+lockouts_total = registry.counter(
+    'ratelimit_lockouts_total', 'Times a client emptied its bucket and was locked out', ['scope', 'key'])
+
+
+class RateLimited(Exception):
+    """Raised before any work is done for a request that is over its limit"""
+    def __init__(self, scope, key, retry_after, limit):
+        super().__init__(f'{scope} rate limit exceeded for {key}; retry in {retry_after:.0f}s')
+        self.scope = scope
+        self.key = key
+        self.retry_after = retry_after
+        self.limit = limit
+
+
+class Rule(object):
+    """capacity requests in a burst, refilled evenly over period seconds.
+
+    Emptying the bucket locks the key out for lockout seconds, doubling with each
+    repeat up to max_lockout; strikes are forgiven once the bucket refills.
+    """
+    def __init__(self, capacity, period, lockout=30, max_lockout=3600):
+        self.capacity = capacity
+        self.period = period
+        self.rate = capacity / period
+        self.lockout = lockout
+        self.max_lockout = max_lockout
+
+
+def take_token(state, rule, now):
+    """Apply one request to a bucket, returning (new state, seconds to wait or 0, whether
+    this request started a lockout).
+
+    state is (tokens, updated, strikes, locked_until) or None for a new key, so any
+    backend that can update a tuple atomically can share this logic.
+    """
+    if state is None:
+        state = (float(rule.capacity), now, 0, 0.0)
+    tokens, updated, strikes, locked_until = state
+
+    if now < locked_until:
+        return state, locked_until - now, False
+
+    tokens = min(float(rule.capacity), tokens + (now - updated) * rule.rate)
+    if tokens >= rule.capacity:
+        strikes = 0
+    if tokens >= 1:
+        return (tokens - 1, now, strikes, 0.0), 0, False
+
+    strikes += 1
+    wait = min(rule.lockout * 2 ** (strikes - 1), rule.max_lockout)
+    return (tokens, now, strikes, now + wait), wait, True
+
+
+class RateLimitStore(object):
+    """Backend interface for bucket state"""
+    def consume(self, key, rule, now):
+        """Atomically take one token for key, returning (seconds to wait or 0, locked out now)"""
+        raise NotImplementedError
+
+    def reset(self, key):
+        raise NotImplementedError
+
+
+class MemoryStore(RateLimitStore):
+    """Buckets held in this process; limits apply per worker and reset on restart"""
+    def __init__(self, max_keys=100000):
+        self._buckets = LRUCache(max_entries=max_keys)
+        self._lock = threading.Lock()
+
+    def consume(self, key, rule, now):
+        with self._lock:
+            state, wait, locked = take_token(self._buckets.get(key), rule, now)
+            self._buckets.set(key, state)
+        return wait, locked
+
+    def reset(self, key):
+        self._buckets.pop(key)
+
+
+class RateLimiter(object):
+    """Limits requests to an endpoint per client IP and, optionally, per submitted username"""
+    def __init__(self, app=None, store=None):
+        self.store = store
+        self.enabled = True
+        self.rules = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app, store=None):
+        app.config.setdefault('RATELIMIT_ENABLED', True)
+        app.config.setdefault('RATELIMIT_MAX_KEYS', 100000)
+        app.config.setdefault('RATELIMIT_RULES', {})
+
+        self.enabled = app.config['RATELIMIT_ENABLED']
+        self.rules = {
+            (scope, key): Rule(**settings)
+            for scope, keys in app.config['RATELIMIT_RULES'].items()
+            for key, settings in keys.items()
+        }
+        self.store = store or self.store or MemoryStore(app.config['RATELIMIT_MAX_KEYS'])
+        app.extensions['rate_limiter'] = self
+
+    def hit(self, scope, key, value):
+        """Count one request against scope's rule for key, raising RateLimited when over"""
+        rule = self.rules.get((scope, key))
+        if rule is None or not value:
+            return
+        wait, locked = self.store.consume(f'{scope}:{key}:{value}', rule, time.time())
+        if locked:
+            lockouts_total.inc(scope=scope, key=key)
+        if wait:
+            rejected_total.inc(scope=scope, key=key)
+            raise RateLimited(scope, key, wait, rule.capacity)
+
+    def reset(self, scope, key, value):
+        """Forget a key's history, e.g. a username after a successful login"""
+        if value and (scope, key) in self.rules:
+            self.store.reset(f'{scope}:{key}:{value}')
+
+    def limit(self, scope, username_field=None, methods=('POST',)):
+        """Decorator that checks requests (POSTs by default) against the scope's rules before the view runs"""
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if self.enabled and request.method in methods:
+                    self.hit(scope, 'ip', request.remote_addr)
+                    if username_field:
+                        self.hit(scope, 'username', normalize_username(request.form.get(username_field)))
+                return view(*args, **kwargs)
+            return wrapper
+        return decorator
+
+
+def normalize_username(value):
+    """Bucket key for a submitted username, so case and padding do not dodge the limit"""
+    return (value or '').strip().lower()[:100]
+
+
+def rejection_headers(error):
+    """Headers telling a client when it may retry"""
+    return {
+        'Retry-After': str(math.ceil(error.retry_after)),
+        'X-RateLimit-Limit': str(error.limit),
+        'X-RateLimit-Remaining': '0',
+        'X-RateLimit-Reset': str(math.ceil(time.time() + error.retry_after)),
+    }
@@ -1,212 +1,240 @@
-"""
-Lab 9: Dynamic Code Analysis - Runtime Testing
-Run this to perform dynamic analysis on your Flask application
-"""
-
-import time
-import sys
-
-print("=" * 80)
-print("LAB 9: DYNAMIC CODE ANALYSIS")
-print("=" * 80)
-
-print("\n" + "=" * 80)
-print("PART 1: APPLICATION TESTING")
-print("=" * 80)
-print("\nDynamic analysis tests the application during runtime.")
-print("Make sure your Flask app is running on http://localhost:5000")
-print()
-
-# Check if requests is available
-try:
-    import requests
-    
-    print("Testing application endpoints...")
-    base_url = "http://localhost:5000"
-    
-    tests = [
-        ("GET", "/", "Home page"),
-        ("GET", "/login", "Login page"),
-        ("GET", "/register", "Register page"),
-    ]
-    
-    print()
-    for method, endpoint, description in tests:
-        try:
-            if method == "GET":
-                response = requests.get(f"{base_url}{endpoint}", timeout=5)
-                status = "✓ PASS" if response.status_code == 200 else f"✗ FAIL ({response.status_code})"
-                print(f"{description:20} {endpoint:20} {status}")
-        except requests.exceptions.ConnectionError:
-            print(f"{description:20} {endpoint:20} ✗ FAIL (App not running)")
-            print("\nPlease start the Flask app first:")
-            print("  python app.py")
-            break
-        except Exception as e:
-            print(f"{description:20} {endpoint:20} ✗ ERROR: {e}")
-    
-except ImportError:
-    print("⚠ 'requests' library not installed")
-    print("Install it with: pip install requests")
-
-print("\n" + "=" * 80)
-print("PART 2: SECURITY TESTING - SQL INJECTION")
-print("=" * 80)
-print("\nTesting SQL injection prevention...")
-
-sql_injection_tests = [
-    "admin' OR '1'='1",
-    "admin'--",
-    "admin' /*",
-    "' OR 1=1--",
-    "admin'; DROP TABLE users--",
-    "1' UNION SELECT * FROM users--"
-]
-
-print("\nMalicious inputs that SHOULD BE BLOCKED:")
-for i, test_input in enumerate(sql_injection_tests, 1):
-    print(f"{i}. {test_input}")
-
-print("\n✓ These are blocked by NoSQLKeywords validator in forms.py")
-print("  Test manually: Try entering these in the login form")
-
-print("\n" + "=" * 80)
-print("PART 3: SECURITY TESTING - XSS (Cross-Site Scripting)")
-print("=" * 80)
-print("\nTesting XSS attack prevention...")
-
-xss_tests = [
-    "<script>alert('XSS')</script>",
-    "<img src=x onerror=alert('XSS')>",
-    "<svg onload=alert('XSS')>",
-    "javascript:alert('XSS')",
-    "<iframe src='javascript:alert(1)'>",
-]
-
-print("\nMalicious inputs that SHOULD BE BLOCKED:")
-for i, test_input in enumerate(xss_tests, 1):
-    print(f"{i}. {test_input}")
-
-print("\n✓ These are blocked by NoHTMLTags validator in forms.py")
-print("  Test manually: Try entering these in registration/contact forms")
-
-print("\n" + "=" * 80)
-print("PART 4: SECURITY TESTING - CSRF")
-print("=" * 80)
-print("\nTesting CSRF protection...")
-
-print("\nCSRF Test Steps:")
-print("1. Open browser and go to http://localhost:5000/login")
-print("2. Press F12 → Elements tab")
-print("3. Find the csrf_token hidden input")
-print("4. Delete the csrf_token element")
-print("5. Try to submit the form")
-print("6. Expected: 400 Bad Request error")
-print("\n✓ CSRF tokens are present on all forms")
-print("✓ Flask-WTF automatically validates tokens")
-
-print("\n" + "=" * 80)
-print("PART 5: SESSION SECURITY TESTING")
-print("=" * 80)
-print("\nTesting session management...")
-
-print("\nSession Security Tests:")
-print("1. Login to the application")
-print("2. Open DevTools (F12) → Application → Cookies")
-print("3. Check 'session' cookie properties:")
-print("   ✓ HttpOnly: Should be checked (prevents XSS)")
-print("   ✓ SameSite: Should be 'Lax' (prevents CSRF)")
-print("   ✓ Secure: Should be checked in production (HTTPS)")
-print("\n4. Wait 30 minutes (or change PERMANENT_SESSION_LIFETIME)")
-print("5. Try accessing /dashboard")
-print("6. Expected: Redirect to login (session expired)")
-
-print("\n" + "=" * 80)
-print("PART 6: PASSWORD SECURITY TESTING")
-print("=" * 80)
-print("\nTesting password hashing...")
-
-try:
-    from flask_bcrypt import Bcrypt
-    from flask import Flask
-    
-    app = Flask(__name__)
-    bcrypt = Bcrypt(app)
-    
-    test_password = "TestPassword123!"
-    hash1 = bcrypt.generate_password_hash(test_password).decode('utf-8')
-    hash2 = bcrypt.generate_password_hash(test_password).decode('utf-8')
-    
-    print(f"\nPassword: {test_password}")
-    print(f"Hash 1:   {hash1}")
-    print(f"Hash 2:   {hash2}")
-    print(f"\n✓ Same password = Different hashes (unique salt)")
-    print(f"✓ Verify Hash 1: {bcrypt.check_password_hash(hash1, test_password)}")
-    print(f"✓ Verify Hash 2: {bcrypt.check_password_hash(hash2, test_password)}")
-    print(f"✗ Wrong password: {bcrypt.check_password_hash(hash1, 'WrongPassword')}")
-    
-except Exception as e:
-    print(f"Error: {e}")
-
-print("\n" + "=" * 80)
-print("PART 7: ERROR HANDLING TESTING")
-print("=" * 80)
-print("\nTesting custom error pages...")
-
-print("\nError Page Tests:")
-print("1. 404 - Visit: http://localhost:5000/nonexistent")
-print("   Expected: Clean 404 page (no stack trace)")
-print("\n2. 400 - Delete CSRF token and submit form")
-print("   Expected: Clean 400 page")
-print("\n3. Check that errors don't reveal:")
-print("   ✗ File paths")
-print("   ✗ Database structure")
-print("   ✗ Framework versions")
-print("   ✗ Stack traces")
-
-print("\n" + "=" * 80)
-print("PART 8: INPUT VALIDATION TESTING")
-print("=" * 80)
-print("\nTesting input validators...")
-
-try:
-    from forms import NoSQLKeywords, NoHTMLTags
-    from wtforms import Form, StringField
-    
-    class TestForm(Form):
-        test_field = StringField('test', validators=[NoSQLKeywords(), NoHTMLTags()])
-    
-    # Test SQL keywords
-    test_inputs = {
-        "normal text": True,
-        "admin' OR '1'='1": False,
-        "<script>alert(1)</script>": False,
-        "DROP TABLE users": False,
-        "Hello World": True,
-    }
-    
-    print("\nValidator Tests:")
-    for input_text, should_pass in test_inputs.items():
-        form = TestForm(data={'test_field': input_text})
-        passed = form.validate()
-        status = "✓ PASS" if passed == should_pass else "✗ FAIL"
-        result = "Allowed" if passed else "Blocked"
-        print(f"{status} '{input_text}' → {result}")
-    
-except Exception as e:
-    print(f"Error: {e}")
-
-print("\n" + "=" * 80)
-print("DYNAMIC ANALYSIS COMPLETE!")
-print("=" * 80)
-print("\nSUMMARY:")
-print("1. ✓ Endpoint Testing - All routes accessible")
-print("2. ✓ SQL Injection Prevention - NoSQLKeywords validator working")
-print("3. ✓ XSS Prevention - NoHTMLTags validator working")
-print("4. ✓ CSRF Protection - Tokens present on all forms")
-print("5. ✓ Session Security - HttpOnly, SameSite, Timeout configured")
-print("6. ✓ Password Security - Bcrypt hashing with unique salts")
-print("7. ✓ Error Handling - Custom pages, no info disclosure")
-print("8. ✓ Input Validation - Malicious inputs blocked")
-print("\nAll security measures are working correctly!")
-print("=" * 80 + "\n")
+"""
+Lab 9: Dynamic Code Analysis - Runtime Testing
+Run this to perform dynamic analysis on your Flask application
+"""
+
+import time
+import sys
+
+print("=" * 80)
+print("LAB 9: DYNAMIC CODE ANALYSIS")
+print("=" * 80)
+
+print("\n" + "=" * 80)
+print("PART 1: APPLICATION TESTING")
+print("=" * 80)
+print("\nDynamic analysis tests the application during runtime.")
+print("Make sure your Flask app is running on http://localhost:5000 with rate limiting off:")
+print("  RATELIMIT_ENABLED=0 python app.py")
+print("(every simulated user comes from one address, and registration is limited per address)")
+print()
+
+# Check if requests is available
+try:
+    import requests
+    from benchmarks.loadtest import HttpTarget, run_load
+    
+    print("Replaying concurrent user sessions against the running app...")
+    base_url = "http://localhost:5000"
+    
+    try:
+        requests.get(base_url, timeout=5)
+        # register → login (CSRF) → add contacts → dashboard → delete → logout
+        report = run_load(lambda: HttpTarget(base_url), users=4, sessions=8, contacts=2)
+        print()
+        report.print_table()
+        status = "✓ PASS" if report.failed_sessions == 0 else f"✗ FAIL ({report.failed_sessions} session(s) failed)"
+        print(f"\nSession flow: {status}")
+        if report.failed_sessions:
+            print("If requests were refused with 429, restart the app with RATELIMIT_ENABLED=0")
+        print("Run 'python -m benchmarks.loadtest --url http://localhost:5000' for a bigger load test")
+    except requests.exceptions.ConnectionError:
+        print("✗ FAIL (App not running)")
+        print("\nPlease start the Flask app first:")
+        print("  RATELIMIT_ENABLED=0 python app.py")
+    
+except ImportError:
+    print("⚠ 'requests' library not installed")
+    print("Install it with: pip install requests")
+
+print("\n" + "=" * 80)
+print("PART 2: SECURITY TESTING - SQL INJECTION")
+print("=" * 80)
+print("\nTesting SQL injection prevention...")
+
+sql_injection_tests = [
+    "admin' OR '1'='1",
+    "admin'--",
+    "admin' /*",
+    "' OR 1=1--",
+    "admin'; DROP TABLE users--",
+    "1' UNION SELECT * FROM users--"
+]
+
+print("\nMalicious inputs that SHOULD BE BLOCKED:")
+for i, test_input in enumerate(sql_injection_tests, 1):
+    print(f"{i}. {test_input}")
+
+print("\n✓ These are blocked by NoSQLKeywords validator in forms.py")
+print("  Test manually: Try entering these in the login form")
+
+print("\n" + "=" * 80)
+print("PART 3: SECURITY TESTING - XSS (Cross-Site Scripting)")
+print("=" * 80)
+print("\nTesting XSS attack prevention...")
+
+xss_tests = [
+    "<script>alert('XSS')</script>",
+    "<img src=x onerror=alert('XSS')>",
+    "<svg onload=alert('XSS')>",
+    "javascript:alert('XSS')",
+    "<iframe src='javascript:alert(1)'>",
+]
+
+print("\nMalicious inputs that SHOULD BE BLOCKED:")
+for i, test_input in enumerate(xss_tests, 1):
+    print(f"{i}. {test_input}")
+
+print("\n✓ These are blocked by NoHTMLTags validator in forms.py")
+print("  Test manually: Try entering these in registration/contact forms")
+
+print("\n" + "=" * 80)
+print("PART 4: SECURITY TESTING - CSRF")
+print("=" * 80)
+print("\nTesting CSRF protection...")
+
+print("\nCSRF Test Steps:")
+print("1. Open browser and go to http://localhost:5000/login")
+print("2. Press F12 → Elements tab")
+print("3. Find the csrf_token hidden input")
+print("4. Delete the csrf_token element")
+print("5. Try to submit the form")
+print("6. Expected: 400 Bad Request error")
+print("\n✓ CSRF tokens are present on all forms")
+print("✓ Flask-WTF automatically validates tokens")
+
+print("\n" + "=" * 80)
+print("PART 5: SESSION SECURITY TESTING")
+print("=" * 80)
+print("\nTesting session management...")
+
+print("\nSession Security Tests:")
+print("1. Login to the application")
+print("2. Open DevTools (F12) → Application → Cookies")
+print("3. Check 'session' cookie properties:")
+print("   ✓ HttpOnly: Should be checked (prevents XSS)")
+print("   ✓ SameSite: Should be 'Lax' (prevents CSRF)")
+print("   ✓ Secure: Should be checked in production (HTTPS)")
+print("\n4. Wait 30 minutes (or change PERMANENT_SESSION_LIFETIME)")
+print("5. Try accessing /dashboard")
+print("6. Expected: Redirect to login (session expired)")
+
+print("\n" + "=" * 80)
+print("PART 6: PASSWORD SECURITY TESTING")
+print("=" * 80)
+print("\nTesting password hashing...")
+
+try:
+    from flask import Flask
+    from passwords import PasswordHasher
+    
+    app = Flask(__name__)
+    app.config['PASSWORD_POOL_WORKERS'] = 0
+    bcrypt = PasswordHasher(app)
+    
+    test_password = "TestPassword123!"
+    hash1 = bcrypt.generate_password_hash(test_password)
+    hash2 = bcrypt.generate_password_hash(test_password)
+    
+    print(f"\nPassword: {test_password}")
+    print(f"Hash 1:   {hash1}")
+    print(f"Hash 2:   {hash2}")
+    print(f"\n✓ Same password = Different hashes (unique salt)")
+    print(f"✓ Verify Hash 1: {bcrypt.check_password_hash(hash1, test_password)}")
+    print(f"✓ Verify Hash 2: {bcrypt.check_password_hash(hash2, test_password)}")
+    print(f"✗ Wrong password: {bcrypt.check_password_hash(hash1, 'WrongPassword')}")
+    
+except Exception as e:
+    print(f"Error: {e}")
+
+print("\n" + "=" * 80)
+print("PART 7: ERROR HANDLING TESTING")
+print("=" * 80)
+print("\nTesting custom error pages...")
+
+print("\nError Page Tests:")
+print("1. 404 - Visit: http://localhost:5000/nonexistent")
+print("   Expected: Clean 404 page (no stack trace)")
+print("\n2. 400 - Delete CSRF token and submit form")
+print("   Expected: Clean 400 page")
+print("\n3. Check that errors don't reveal:")
+print("   ✗ File paths")
+print("   ✗ Database structure")
+print("   ✗ Framework versions")
+print("   ✗ Stack traces")
+
+print("\nAPI Error Tests (JSON bodies, including paths no route matches):")
+try:
+    import os
+    import tempfile
+    from app import create_app
+
+    db_dir = tempfile.mkdtemp()
+    client = create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(db_dir, 'dynamic.db'),
+        'SESSION_SQLITE_PATH': os.path.join(db_dir, 'sessions.db'),
+        'PASSWORD_POOL_WORKERS': 0,
+    }).test_client()
+
+    api_error_tests = [
+        ('GET', '/api/v1/no-such-route', 404),
+        ('GET', '/api/v2/contacts', 404),
+        ('PUT', '/api/v1/contacts', 405),
+        ('GET', '/api/v1/contacts', 401),
+    ]
+    for method, path, expected in api_error_tests:
+        response = client.open(path, method=method)
+        body = response.get_json(silent=True)
+        passed = response.status_code == expected and isinstance(body, dict) and 'error' in body
+        status = "✓ PASS" if passed else "✗ FAIL"
+        print(f"{status} {method} {path} → {response.status_code} {response.mimetype}")
+
+except Exception as e:
+    print(f"Error: {e}")
+
+print("\n" + "=" * 80)
+print("PART 8: INPUT VALIDATION TESTING")
+print("=" * 80)
+print("\nTesting input validators...")
+
+try:
+    from forms import NoSQLKeywords, NoHTMLTags
+    from wtforms import Form, StringField
+    
+    class TestForm(Form):
+        test_field = StringField('test', validators=[NoSQLKeywords(), NoHTMLTags()])
+    
+    # Test SQL keywords
+    test_inputs = {
+        "normal text": True,
+        "admin' OR '1'='1": False,
+        "<script>alert(1)</script>": False,
+        "DROP TABLE users": False,
+        "Hello World": True,
+    }
+    
+    print("\nValidator Tests:")
+    for input_text, should_pass in test_inputs.items():
+        form = TestForm(data={'test_field': input_text})
+        passed = form.validate()
+        status = "✓ PASS" if passed == should_pass else "✗ FAIL"
+        result = "Allowed" if passed else "Blocked"
+        print(f"{status} '{input_text}' → {result}")
+    
+except Exception as e:
+    print(f"Error: {e}")
+
+print("\n" + "=" * 80)
+print("DYNAMIC ANALYSIS COMPLETE!")
+print("=" * 80)
+print("\nSUMMARY:")
+print("1. ✓ Endpoint Testing - All routes accessible")
+print("2. ✓ SQL Injection Prevention - NoSQLKeywords validator working")
+print("3. ✓ XSS Prevention - NoHTMLTags validator working")
+print("4. ✓ CSRF Protection - Tokens present on all forms")
+print("5. ✓ Session Security - HttpOnly, SameSite, Timeout configured")
+print("6. ✓ Password Security - Bcrypt hashing with unique salts")
+print("7. ✓ Error Handling - Custom pages, no info disclosure")
+print("8. ✓ Input Validation - Malicious inputs blocked")
+print("\nAll security measures are working correctly!")
+print("=" * 80 + "\n")
@@ -0,0 +1,151 @@
+"""
+Query Plan Check - fails if any route falls back to a full table scan
+Run this after changing a query or an index in models.py
+"""
+
+import os
+import re
+import sys
+import tempfile
+import threading
+
+from sqlalchemy import event
+
+from app import create_app
+from models import db, ApiToken, User, Contact, create_api_token, delete_user, purge_contacts, upgrade_schema
+
+# Tables whose full scans count as failures
+MODEL_TABLES = {User.__tablename__, Contact.__tablename__, ApiToken.__tablename__}
+FULL_SCAN = re.compile(r'^SCAN (\w+)')
+
+captured = []
+
+
+def capture_statement(conn, cursor, statement, parameters, context, executemany):
+    """Remember every read issued while a route is handled"""
+    # Background threads, such as the username filter build, are not routes
+    if threading.current_thread() is not threading.main_thread():
+        return
+    if statement.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE')) and not executemany:
+        captured.append((statement, parameters))
+
+
+def visit(client, method, path, expect, reads=True, **kwargs):
+    """Request path, failing unless it answers expect and, if reads, issues a captured statement"""
+    start = len(captured)
+    response = client.open(path, method=method, **kwargs)
+    response.get_data()
+    if response.status_code != expect:
+        raise RuntimeError(f'{method} {path} returned {response.status_code}, expected {expect}')
+    if reads and len(captured) == start:
+        raise RuntimeError(f'{method} {path} issued no statements')
+    return response
+
+
+def seed(app, client):
+    """Create a user with a few pages of contacts"""
+    visit(client, 'POST', '/register', 302, reads=False,
+          data={'username': 'plancheck', 'password': 'plancheck-password'})
+    with app.app_context():
+        user = User.query.filter_by(username='plancheck').first()
+        db.session.add_all([
+            Contact(name=f'Contact {i}', email=f'c{i}@example.com', phone='5550000000',
+                    address='1 Example Street', user_id=user.id)
+            for i in range(120)
+        ])
+        db.session.commit()
+
+
+def exercise_routes(app, client):
+    """Hit every route that touches the database"""
+    visit(client, 'POST', '/login', 302, data={'username': 'plancheck', 'password': 'plancheck-password'})
+    visit(client, 'GET', '/dashboard', 200)
+    visit(client, 'GET', '/dashboard?after=50', 200)
+    visit(client, 'GET', '/dashboard?before=51', 200)
+    visit(client, 'POST', '/contact', 302, data={'name': 'New Contact', 'email': 'new@example.com',
+                                                 'phone': '5550000001', 'address': '2 Example Street'})
+    visit(client, 'GET', '/register/check?username=plancheck', 200)
+    visit(client, 'GET', '/dashboard/all', 200)
+    visit(client, 'GET', '/contacts/export.csv', 200)
+    visit(client, 'GET', '/search?q=contact 1', 200)
+    visit(client, 'POST', '/delete/1', 302)
+
+    with app.app_context():
+        token = create_api_token(User.query.filter_by(username='plancheck').first().id, 'plan-check')
+    headers = {'Authorization': f'Bearer {token}'}
+    visit(client, 'GET', '/api/v1/contacts?after=10&fields=name', 200, headers=headers)
+    visit(client, 'GET', '/api/v1/contacts/2', 200, headers=headers)
+    visit(client, 'PATCH', '/api/v1/contacts/2', 200, json={'name': 'Renamed Contact'}, headers=headers)
+    visit(client, 'DELETE', '/api/v1/contacts', 200, json={'ids': [3, 4]}, headers=headers)
+
+    # Registration only inserts; account deletion and the purger run outside any request
+    visit(client, 'POST', '/register', 302, reads=False,
+          data={'username': 'plandelete', 'password': 'plancheck-password'})
+    with app.app_context():
+        delete_user(User.query.filter_by(username='plandelete').first().id)
+        db.session.commit()
+        purge_contacts(batch_size=2)
+
+
+def main():
+    print("=" * 80)
+    print("QUERY PLAN CHECK")
+    print("=" * 80)
+
+    # Run against a throwaway database; bcrypt inline and cheap, since a forkserver pool
+    # would re-import this script in every pool process, and no throttling so every
+    # login and registration gets through
+    db_dir = tempfile.mkdtemp()
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(db_dir, 'plan_check.db'),
+        'WTF_CSRF_ENABLED': False,
+        'SESSION_SQLITE_PATH': os.path.join(db_dir, 'sessions.db'),
+        'PASSWORD_POOL_WORKERS': 0,
+        'BCRYPT_LOG_ROUNDS': 4,
+        'RATELIMIT_ENABLED': False,
+    })
+    with app.app_context():
+        upgrade_schema()
+
+    client = app.test_client()
+    with app.app_context():
+        try:
+            seed(app, client)
+            event.listen(db.engine, 'before_cursor_execute', capture_statement)
+            try:
+                exercise_routes(app, client)
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', capture_statement)
+        except RuntimeError as error:
+            print(f"\n✗ {error}")
+            print("=" * 80 + "\n")
+            return 1
+
+        failures = 0
+        seen = set()
+        with db.engine.connect() as conn:
+            for statement, parameters in captured:
+                if statement in seen:
+                    continue
+                seen.add(statement)
+                plan = conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).fetchall()
+                details = [row[-1] for row in plan]
+                scans = [d for d in details if FULL_SCAN.match(d) and FULL_SCAN.match(d).group(1) in MODEL_TABLES]
+                status = "✗ FULL SCAN" if scans else "✓ PASS"
+                print(f"\n{status}  {' '.join(statement.split())}")
+                for detail in details:
+                    print(f"    {detail}")
+                failures += bool(scans)
+
+    print("\n" + "=" * 80)
+    if failures:
+        print(f"✗ {failures} statement(s) fall back to a full table scan")
+        print("=" * 80 + "\n")
+        return 1
+    print(f"✓ All {len(seen)} statement(s) use an index")
+    print("=" * 80 + "\n")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,112 @@
+"""
+Production launcher: pre-forked gunicorn workers with zero-downtime reloads
+
+    python serve.py start [--workers 8] [--bind 0.0.0.0:8000]
+    python serve.py reload    # load new code without dropping a request
+    python serve.py stop
+"""
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import time
+
+from config import env_int
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+PIDFILE = os.environ.get('GUNICORN_PIDFILE', os.path.join(ROOT, 'gunicorn.pid'))
+
+
+def read_pid(path):
+    try:
+        with open(path) as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return None
+
+
+def wait_for(predicate, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.2)
+    return False
+
+
+def start(args):
+    """Create or upgrade the schema once, then replace this process with the gunicorn master"""
+    if not args.skip_upgrade:
+        subprocess.run([sys.executable, '-m', 'flask', '--app', 'app', 'upgrade-db'], cwd=ROOT, check=True)
+    os.environ['GUNICORN_PIDFILE'] = PIDFILE
+    if args.workers:
+        os.environ['WEB_CONCURRENCY'] = str(args.workers)
+    if args.bind:
+        os.environ['BIND'] = args.bind
+    os.chdir(ROOT)
+    # The console script, not python -m gunicorn: USR2 re-executes argv, and running
+    # gunicorn/__main__.py as a script puts gunicorn/http ahead of the stdlib http package
+    os.execvp('gunicorn', ['gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app'])
+
+
+def reload(args):
+    """Start a new master on the new code beside the old one, then retire the old one.
+
+    With preload_app a plain HUP would fork new workers from the old import, so code
+    changes need a new master: USR2 starts it on the same sockets, WINCH lets the old
+    workers finish their requests, and TERM stops the old master.
+    """
+    old = read_pid(PIDFILE)
+    if old is None:
+        sys.exit(f'No running server ({PIDFILE} not found)')
+    os.kill(old, signal.SIGUSR2)
+
+    # The new master writes its pid beside the old one's and takes over the
+    # pidfile once the old master has exited
+    new = None
+    if wait_for(lambda: read_pid(PIDFILE + '.2') not in (None, old), args.timeout):
+        new = read_pid(PIDFILE + '.2')
+    if new is None:
+        sys.exit('New master did not start; the old one is still serving')
+    # Let the new workers start accepting before the old ones stop
+    time.sleep(args.warmup)
+    os.kill(old, signal.SIGWINCH)
+    os.kill(old, signal.SIGTERM)
+    print(f"Reloaded: master {old} -> {new}")
+
+
+def stop(args):
+    """Graceful shutdown: workers finish in-flight requests first"""
+    pid = read_pid(PIDFILE)
+    if pid is None:
+        sys.exit(f'No running server ({PIDFILE} not found)')
+    os.kill(pid, signal.SIGTERM)
+    print(f"Stopping master {pid}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the app on pre-forked gunicorn workers')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    start_parser = commands.add_parser('start', help='Start the server in the foreground')
+    start_parser.add_argument('--workers', type=int, help='Worker processes (default: one per core)')
+    start_parser.add_argument('--bind', help='Address to listen on (default: 0.0.0.0:8000)')
+    start_parser.add_argument('--skip-upgrade', action='store_true', help='Do not run upgrade-db first')
+    start_parser.set_defaults(func=start)
+
+    reload_parser = commands.add_parser('reload', help='Swap in new code without downtime')
+    reload_parser.add_argument('--timeout', type=float, default=env_int('GUNICORN_TIMEOUT', 30))
+    reload_parser.add_argument('--warmup', type=float, default=2.0,
+                               help='Seconds both generations serve before the old one stops')
+    reload_parser.set_defaults(func=reload)
+
+    stop_parser = commands.add_parser('stop', help='Stop the server gracefully')
+    stop_parser.set_defaults(func=stop)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,273 @@
+"""
+Server-side sessions: the cookie carries only a random session id
+"""
+import json
+import os
+import re
+import secrets
+import sqlite3
+import threading
+import time
+
+from flask.sessions import SessionInterface, SessionMixin, session_json_serializer
+from werkzeug.datastructures import CallbackDict
+
+from cache import LRUCache
+from daemons import DaemonThread
+from metrics import registry
+
+SESSION_ID = re.compile(r'^[A-Za-z0-9_-]{32,128}$')
+
+cache_lookups = registry.counter('session_cache_lookups_total', 'Session cache lookups', ['result'])
+sessions_swept = registry.counter('sessions_swept_total', 'Expired sessions removed by the sweeper')
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    """Session dict that remembers its id and whether it changed"""
+    def __init__(self, initial=None, sid=None, new=False, expires=None):
+        def on_update(self):
+            self.modified = True
+        CallbackDict.__init__(self, initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.expires = expires
+        self.modified = False
+        self.loaded_user_id = self.get('user_id')
+
+
+class SessionStore(object):
+    """Backend interface: records are (serialized data, expiry timestamp)"""
+    def load(self, sid):
+        raise NotImplementedError
+
+    def save(self, sid, data, expires, user_id):
+        raise NotImplementedError
+
+    def delete(self, sid):
+        raise NotImplementedError
+
+    def delete_user(self, user_id):
+        """Delete every session belonging to a user, returning their ids"""
+        raise NotImplementedError
+
+    def sweep(self, now):
+        """Delete expired sessions, returning how many were removed"""
+        raise NotImplementedError
+
+
+class SQLiteSessionStore(SessionStore):
+    """Sessions in a dedicated SQLite file, one connection per thread"""
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS sessions ('
+                         'sid TEXT PRIMARY KEY, data TEXT NOT NULL, user_id INTEGER, expires REAL NOT NULL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_sessions_expires ON sessions (expires)')
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_sessions_user_id ON sessions (user_id)')
+
+    def _connect(self):
+        # Keyed by pid as well, so a forked worker never reuses its parent's connection
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def load(self, sid):
+        return self._connect().execute('SELECT data, expires FROM sessions WHERE sid = ?', (sid,)).fetchone()
+
+    def save(self, sid, data, expires, user_id):
+        self._connect().execute('INSERT OR REPLACE INTO sessions (sid, data, user_id, expires) VALUES (?, ?, ?, ?)',
+                                (sid, data, user_id, expires))
+
+    def delete(self, sid):
+        self._connect().execute('DELETE FROM sessions WHERE sid = ?', (sid,))
+
+    def delete_user(self, user_id):
+        conn = self._connect()
+        sids = [row[0] for row in conn.execute('SELECT sid FROM sessions WHERE user_id = ?', (user_id,))]
+        conn.execute('DELETE FROM sessions WHERE user_id = ?', (user_id,))
+        return sids
+
+    def sweep(self, now):
+        return self._connect().execute('DELETE FROM sessions WHERE expires < ?', (now,)).rowcount
+
+
+class FileSessionStore(SessionStore):
+    """Sessions as one small JSON file each in a local directory"""
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, sid):
+        return os.path.join(self.directory, sid)
+
+    def _read(self, path):
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def load(self, sid):
+        record = self._read(self._path(sid))
+        return (record['data'], record['expires']) if record else None
+
+    def save(self, sid, data, expires, user_id):
+        path = self._path(sid)
+        temp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(temp, 'w') as f:
+            json.dump({'data': data, 'expires': expires, 'user_id': user_id}, f)
+        os.replace(temp, path)
+
+    def delete(self, sid):
+        try:
+            os.remove(self._path(sid))
+        except FileNotFoundError:
+            pass
+
+    def _records(self):
+        for name in os.listdir(self.directory):
+            if SESSION_ID.match(name):
+                record = self._read(self._path(name))
+                if record is not None:
+                    yield name, record
+
+    def delete_user(self, user_id):
+        sids = [sid for sid, record in self._records() if record.get('user_id') == user_id]
+        for sid in sids:
+            self.delete(sid)
+        return sids
+
+    def sweep(self, now):
+        expired = [sid for sid, record in self._records() if record['expires'] < now]
+        for sid in expired:
+            self.delete(sid)
+        return len(expired)
+
+
+class ServerSideSessionInterface(SessionInterface):
+    """Keeps session data in a store, fronted by a per-process LRU cache keyed by session id.
+
+    Cache entries live for at most cache_ttl seconds, which bounds how long another
+    worker process can keep serving a session revoked elsewhere.
+    """
+    serializer = session_json_serializer
+
+    def __init__(self, store, cache_size=10000, cache_ttl=5.0, sweep_interval=300, refresh_interval=60):
+        self.store = store
+        self.cache = LRUCache(max_entries=cache_size, ttl=cache_ttl)
+        self.sweep_interval = sweep_interval
+        self.refresh_interval = refresh_interval
+        self._sweeper = DaemonThread('session-sweeper')
+
+    def _sweep_forever(self, logger):
+        while True:
+            time.sleep(self.sweep_interval)
+            try:
+                sessions_swept.inc(self.store.sweep(time.time()))
+            except Exception:
+                logger.exception('Session sweep failed')
+
+    def _load(self, sid):
+        record = self.cache.get(sid)
+        cache_lookups.inc(result='hit' if record is not None else 'miss')
+        if record is None:
+            record = self.store.load(sid)
+            if record is None:
+                return None
+            record = tuple(record)
+            self.cache.set(sid, record)
+        if record[1] < time.time():
+            return None
+        return record
+
+    def open_session(self, app, request):
+        # Each worker sweeps the shared store on its own; a sweeper started in the
+        # gunicorn master would be lost at fork
+        self._sweeper.start(self._sweep_forever, app.logger)
+        lifetime = app.permanent_session_lifetime.total_seconds()
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid and SESSION_ID.match(sid):
+            record = self._load(sid)
+            if record is not None:
+                return ServerSession(self.serializer.loads(record[0]), sid=sid, expires=record[1])
+        return ServerSession(sid=secrets.token_urlsafe(32), new=True, expires=time.time() + lifetime)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if not session:
+            if not session.new:
+                # Logging out with session.clear() revokes the session immediately
+                self.revoke(session.sid)
+                response.delete_cookie(name, domain=domain, path=path,
+                                       secure=self.get_cookie_secure(app),
+                                       samesite=self.get_cookie_samesite(app),
+                                       httponly=self.get_cookie_httponly(app))
+            return
+
+        now = time.time()
+        lifetime = app.permanent_session_lifetime.total_seconds()
+        stale = session.expires - now < lifetime - self.refresh_interval
+        if not (session.new or session.modified or stale):
+            return
+
+        if not session.new and session.get('user_id') != session.loaded_user_id:
+            # A new session id on login or user change, so a planted id is never authenticated
+            self.revoke(session.sid)
+            session.sid = secrets.token_urlsafe(32)
+
+        expires = now + lifetime
+        data = self.serializer.dumps(dict(session))
+        self.store.save(session.sid, data, expires, session.get('user_id'))
+        self.cache.set(session.sid, (data, expires))
+        response.vary.add('Cookie')
+        response.set_cookie(name, session.sid, expires=self.get_expiration_time(app, session),
+                            httponly=self.get_cookie_httponly(app), domain=domain, path=path,
+                            secure=self.get_cookie_secure(app), samesite=self.get_cookie_samesite(app))
+
+    def revoke(self, sid):
+        """End one session now"""
+        self.store.delete(sid)
+        self.cache.pop(sid)
+
+    def revoke_user(self, user_id):
+        """End every session belonging to a user, returning how many were removed"""
+        sids = self.store.delete_user(user_id)
+        for sid in sids:
+            self.cache.pop(sid)
+        return len(sids)
+
+
+def init_sessions(app):
+    """Install the configured session backend ('sqlite', 'file' or Flask's default 'cookie')"""
+    app.config.setdefault('SESSION_BACKEND', 'sqlite')
+    app.config.setdefault('SESSION_SQLITE_PATH', os.path.join(app.instance_path, 'sessions.db'))
+    app.config.setdefault('SESSION_FILE_DIR', os.path.join(app.instance_path, 'sessions'))
+    app.config.setdefault('SESSION_CACHE_SIZE', 10000)
+    app.config.setdefault('SESSION_CACHE_TTL', 5.0)
+    app.config.setdefault('SESSION_SWEEP_INTERVAL', 300)
+
+    backend = app.config['SESSION_BACKEND']
+    if backend == 'cookie':
+        return
+    if backend == 'sqlite':
+        os.makedirs(os.path.dirname(os.path.abspath(app.config['SESSION_SQLITE_PATH'])), exist_ok=True)
+        store = SQLiteSessionStore(app.config['SESSION_SQLITE_PATH'])
+    elif backend == 'file':
+        store = FileSessionStore(app.config['SESSION_FILE_DIR'])
+    else:
+        raise ValueError(f'Unknown SESSION_BACKEND: {backend!r}')
+
+    app.session_interface = ServerSideSessionInterface(
+        store,
+        cache_size=app.config['SESSION_CACHE_SIZE'],
+        cache_ttl=app.config['SESSION_CACHE_TTL'],
+        sweep_interval=app.config['SESSION_SWEEP_INTERVAL'],
+    )
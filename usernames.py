@@ -0,0 +1,139 @@
+"""
+In-process username availability filter, so most availability checks never query the database
+"""
+import hashlib
+import math
+import threading
+import time
+
+from flask import current_app
+
+from daemons import DaemonThread
+from metrics import registry
+from models import db, User
+
+lookups = registry.counter('username_filter_lookups_total', 'Username availability lookups', ['result'])
+
+
+class BloomFilter(object):
+    """Fixed-size Bloom filter over strings: no false negatives, false positives at about error_rate"""
+    def __init__(self, capacity, error_rate=0.01):
+        self.bits = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.bits / capacity * math.log(2)))
+        self.array = bytearray((self.bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, value):
+        # Double hashing: k positions from two 64-bit halves of one digest
+        digest = hashlib.blake2b(value.encode('utf-8'), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.bits for i in range(self.hashes)]
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.array[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, value):
+        return all(self.array[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+class UsernameFilter(object):
+    """Answers "is this username free?" from a Bloom filter of every registered username.
+
+    A miss in the filter means the name is free as far as this worker knows, with no
+    query. A hit is confirmed against the database, since it may be a false positive.
+    The filter is built on a background thread on first use in each worker, updated
+    as this worker registers users, and rebuilt every USERNAME_FILTER_REFRESH seconds
+    to pick up registrations made by other workers. Until the first build finishes
+    every check queries the database; during a rebuild the old filter keeps answering
+    and is swapped for the new one when it is complete. The unique constraint on
+    user.username stays the final word.
+    """
+    def __init__(self, app=None):
+        self.capacity = 1000000
+        self.error_rate = 0.01
+        self.refresh = 300
+        self._filter = None
+        self._started = None
+        # Usernames this worker registered while a build was reading the table
+        self._recent = None
+        self._lock = threading.Lock()
+        self._builder = DaemonThread('username-filter')
+        registry.gauge('username_filter_entries', 'Usernames held in the availability filter',
+                       function=lambda: self._filter.count if self._filter is not None else 0)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('USERNAME_FILTER_CAPACITY', 1000000)
+        app.config.setdefault('USERNAME_FILTER_ERROR_RATE', 0.01)
+        app.config.setdefault('USERNAME_FILTER_REFRESH', 300)
+
+        self.capacity = app.config['USERNAME_FILTER_CAPACITY']
+        self.error_rate = app.config['USERNAME_FILTER_ERROR_RATE']
+        self.refresh = app.config['USERNAME_FILTER_REFRESH']
+        app.extensions['username_filter'] = self
+
+    def _build(self):
+        bloom = BloomFilter(self.capacity, self.error_rate)
+        for (username,) in db.session.execute(db.select(User.username).execution_options(yield_per=5000)):
+            bloom.add(username)
+        return bloom
+
+    def _rebuild(self, app):
+        with self._lock:
+            self._recent = []
+        try:
+            with app.app_context():
+                bloom = self._build()
+        except Exception:
+            app.logger.exception('Username filter build failed')
+            bloom = None
+        with self._lock:
+            if bloom is not None:
+                for username in self._recent:
+                    bloom.add(username)
+                self._filter = bloom
+            self._recent = None
+
+    def _current(self):
+        """The filter to answer from, or None until the first build finishes"""
+        now = time.monotonic()
+        if self._started is None or now - self._started > self.refresh:
+            if self._builder.start(self._rebuild, current_app._get_current_object()):
+                self._started = now
+        return self._filter
+
+    def wait(self, timeout=None):
+        """Start a build if none has run and wait for it; True once a filter is in use"""
+        self._current()
+        self._builder.join(timeout)
+        return self._filter is not None
+
+    def add(self, username):
+        """Record a username this worker has just registered"""
+        with self._lock:
+            if self._filter is not None:
+                self._filter.add(username)
+            if self._recent is not None:
+                self._recent.append(username)
+
+    def maybe_taken(self, username):
+        """False means the username is free as far as the filter knows, without a query"""
+        bloom = self._current()
+        return bloom is None or username in bloom
+
+    def is_available(self, username):
+        """Whether a username is free, querying the database only on a filter hit"""
+        bloom = self._current()
+        if bloom is not None and username not in bloom:
+            lookups.inc(result='absent')
+            return True
+        taken = db.session.query(db.session.query(User.id).filter(User.username == username).exists()).scalar()
+        if bloom is None:
+            lookups.inc(result='unbuilt')
+        else:
+            lookups.inc(result='taken' if taken else 'false_positive')
+        return not taken